@@ -0,0 +1,228 @@
+import gzip
+import io
+import json
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import get_input_stream
+
+# Optional faster codecs; gzip is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+COMPRESSION_THRESHOLD = 1024  # Payloads smaller than this many bytes are sent raw
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+# Largest request body accepted once decompressed, unless the app sets MAX_CONTENT_LENGTH
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+DECODE_CHUNK_SIZE = 64 * 1024
+
+# Codecs this process can use, fastest first: (compress, decompress, streaming reader)
+CODECS = {}
+if zstandard:
+    CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+        lambda stream: zstandard.ZstdDecompressor().stream_reader(stream),
+    )
+if lz4:
+    CODECS["lz4"] = (
+        lz4.frame.compress,
+        lz4.frame.decompress,
+        lambda stream: lz4.frame.LZ4FrameFile(stream, mode="rb"),
+    )
+CODECS["gzip"] = (
+    lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL),
+    gzip.decompress,
+    lambda stream: gzip.GzipFile(fileobj=stream, mode="rb"),
+)
+ACCEPT_ENCODING = ", ".join(CODECS)
+
+# What the codecs raise for corrupt or truncated input
+DECODE_ERRORS = (OSError, EOFError, RuntimeError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# Codecs each upstream peer said it accepts, learnt from its Accept-Encoding response header
+PEER_ENCODINGS = {}
+
+STATS_LOCK = threading.Lock()
+STATS = {
+    "requests_in_compressed": 0,
+    "responses_out_compressed": 0,
+    "requests_out_compressed": 0,
+    "responses_in_compressed": 0,
+    "bytes_before_compression": 0,
+    "bytes_after_compression": 0,
+}
+
+def record(counter, raw_size, wire_size):
+    """Count one compressed payload and the bytes it saved."""
+    with STATS_LOCK:
+        STATS[counter] += 1
+        STATS["bytes_before_compression"] += raw_size
+        STATS["bytes_after_compression"] += wire_size
+
+def choose_encoding(accept_encoding):
+    """Return the fastest codec allowed by an Accept-Encoding header, or None."""
+    accepted = set()
+    for token in (accept_encoding or "").split(","):
+        name, *params = token.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for encoding in CODECS:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+def compress(data, encoding):
+    """Compress bytes with the named codec."""
+    return CODECS[encoding][0](data)
+
+def decompress(data, encoding):
+    """Decompress bytes with the named codec."""
+    return CODECS[encoding][1](data)
+
+class CountingReader:
+    """Wrap a binary stream and count the bytes read from it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+        return data
+
+def read_decompressed(stream, encoding, limit):
+    """
+    Decompress a stream as it is read, stopping once more than limit bytes come out.
+
+    :return: The decompressed bytes; longer than limit if the body is too large.
+    :raises DECODE_ERRORS: If the compressed data is corrupt or truncated.
+    """
+    reader = CODECS[encoding][2](stream)
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = reader.read(min(DECODE_CHUNK_SIZE, limit + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+def error_response(message, status):
+    """Build a JSON error response outside of Flask's request handling."""
+    return Response(json.dumps({"error": message}), status=status, mimetype="application/json")
+
+def init_app(app):
+    """
+    Enable negotiated compression on a Flask app.
+
+    Compressed request bodies are decoded before Flask sees them, with the decoded
+    size capped at MAX_CONTENT_LENGTH (or MAX_DECOMPRESSED_SIZE) so a small body
+    cannot expand without bound. Responses are compressed when the client accepts a
+    codec and the body reaches the threshold, and every response advertises the
+    codecs this service can decode.
+    """
+    wsgi_app = app.wsgi_app
+
+    def decompressing_wsgi_app(environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in CODECS:
+            if not environ.get("CONTENT_LENGTH") and not environ.get("wsgi.input_terminated"):
+                response = error_response("Compressed request bodies need a Content-Length", 411)
+                return response(environ, start_response)
+            limit = app.config.get("MAX_CONTENT_LENGTH") or MAX_DECOMPRESSED_SIZE
+            try:
+                wire = CountingReader(get_input_stream(environ, max_content_length=limit))
+                raw = read_decompressed(wire, encoding, limit)
+            except RequestEntityTooLarge:
+                raw = None
+            except DECODE_ERRORS as e:
+                response = error_response(f"Invalid {encoding} request body: {e}", 400)
+                return response(environ, start_response)
+            if raw is None or len(raw) > limit:
+                response = error_response(f"Request body exceeds {limit} bytes", 413)
+                return response(environ, start_response)
+            record("requests_in_compressed", len(raw), wire.count)
+            environ["wsgi.input"] = io.BytesIO(raw)
+            environ["CONTENT_LENGTH"] = str(len(raw))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = decompressing_wsgi_app
+
+    @app.after_request
+    def compress_response(response):
+        response.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        raw = response.get_data()
+        if not encoding or len(raw) < COMPRESSION_THRESHOLD:
+            return response
+        wire = compress(raw, encoding)
+        response.set_data(wire)
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        record("responses_out_compressed", len(raw), len(wire))
+        return response
+
+    @app.route("/compression_stats", methods=["GET"])
+    def compression_stats():
+        with STATS_LOCK:
+            stats = dict(STATS)
+        stats["bytes_saved"] = stats["bytes_before_compression"] - stats["bytes_after_compression"]
+        stats["codecs"] = list(CODECS)
+        return stats
+
+def post_json(url, payload, timeout=None, headers=None):
+    """
+    POST a JSON payload to another tier, compressing in both directions when worthwhile.
+
+    The request body is only compressed with a codec the peer has advertised.
+
+    :return: Tuple of (status code, decoded JSON body, response headers).
+    """
+    body = json.dumps(payload).encode()
+    request_headers = {"Content-Type": "application/json", "Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+    peer = urlsplit(url).netloc
+    encoding = choose_encoding(PEER_ENCODINGS.get(peer))
+    if encoding and len(body) >= COMPRESSION_THRESHOLD:
+        wire = compress(body, encoding)
+        record("requests_out_compressed", len(body), len(wire))
+        body = wire
+        request_headers["Content-Encoding"] = encoding
+
+    # stream=True keeps requests from decoding the body itself, so every codec is handled here
+    response = requests.post(url, data=body, headers=request_headers, timeout=timeout, stream=True)
+    wire = response.raw.read(decode_content=False)
+    response.close()
+    if "Accept-Encoding" in response.headers:
+        PEER_ENCODINGS[peer] = response.headers["Accept-Encoding"]
+    encoding = response.headers.get("Content-Encoding", "").strip().lower()
+    if encoding in CODECS:
+        raw = decompress(wire, encoding)
+        record("responses_in_compressed", len(raw), len(wire))
+    else:
+        raw = wire
+    return response.status_code, json.loads(raw), response.headers
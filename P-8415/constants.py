@@ -17,3 +17,10 @@ DB_DETAILS = {
     'db_name': 'sakila',
     'port': 3306
 }
+
+# Query execution deadlines in seconds: applied when a request sets none, and the most a request may ask for.
+# Written to instance_details.json, where every tier reads them.
+QUERY_TIMEOUTS = {
+    'default': 30,
+    'max': 300
+}
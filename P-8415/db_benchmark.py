@@ -0,0 +1,158 @@
+import argparse
+import json
+import logging
+import re
+
+# instances_setup configures logging first, so its per-task format is the one in effect
+from instances_setup import (
+    INSTANCE_DETAILS,
+    MAX_PARALLEL_HOSTS,
+    ROOT_PASSWORD,
+    close_ssh_sessions,
+    execute_command,
+    get_ssh_session,
+    run_task_graph,
+    transfer_file,
+)
+
+logger = logging.getLogger(__name__)
+
+SYSBENCH_SCRIPT = 'sysbench_node.sh'
+REMOTE_SCRIPT_PATH = '/home/ubuntu/sysbench_node.sh'
+REPORT_FILE = 'sysbench_report.json'
+
+DEFAULT_WORKLOADS = ['oltp_read_only', 'oltp_point_select']
+DEFAULT_THREADS = [1, 4, 16]
+DEFAULT_DURATION = 30  # seconds per run
+DEFAULT_TABLES = 4
+DEFAULT_TABLE_SIZE = 10000
+
+# Workers are read-only replicas, so anything that writes only runs on the manager
+WRITE_WORKLOADS = {
+    'oltp_read_write', 'oltp_write_only', 'oltp_insert',
+    'oltp_update_index', 'oltp_update_non_index', 'oltp_delete', 'bulk_insert',
+}
+
+# Patterns for the summary sysbench prints at the end of a run
+RESULT_PATTERNS = {
+    'transactions_per_sec': r'transactions:\s+\d+\s+\(([\d.]+) per sec',
+    'queries_per_sec': r'queries:\s+\d+\s+\(([\d.]+) per sec',
+    'latency_avg_ms': r'avg:\s+([\d.]+)',
+    'latency_p95_ms': r'95th percentile:\s+([\d.]+)',
+    'errors_per_sec': r'errors:\s+\d+\s+\(([\d.]+) per sec',
+}
+
+def get_nodes():
+    """Return {node name: public IP} for every MySQL node."""
+    nodes = {'manager': INSTANCE_DETAILS['manager']['public_ips'][0]}
+    for i, worker_ip in enumerate(INSTANCE_DETAILS['worker']['public_ips'], start=1):
+        nodes[f'worker-{i}'] = worker_ip
+    return nodes
+
+def run_node_script(ip_address, action, workload='', threads='', duration='', tables='', table_size='', gtid_set=''):
+    """Run one sysbench_node.sh action on a node and return its output."""
+    ssh = get_ssh_session(ip_address)
+    command = f"bash {REMOTE_SCRIPT_PATH} {action} {ROOT_PASSWORD} '{workload}' '{threads}' '{duration}' '{tables}' '{table_size}' '{gtid_set}'"
+    _, output, _ = execute_command(ssh, command, check=True)
+    return output
+
+def parse_sysbench_output(output):
+    """Extract throughput and latency figures from a sysbench run."""
+    result = {}
+    for key, pattern in RESULT_PATTERNS.items():
+        match = re.search(pattern, output)
+        result[key] = float(match.group(1)) if match else None
+    return result
+
+def run_phase(nodes, func, max_parallel):
+    """Run func(ip) on every node at once; return (results by node, failed nodes)."""
+    tasks = {name: {'deps': [], 'run': lambda results, ip=ip: func(ip)} for name, ip in nodes.items()}
+    return run_task_graph(tasks, max_parallel)
+
+def benchmark_cluster(workloads, thread_counts, duration, tables, table_size, max_parallel=MAX_PARALLEL_HOSTS):
+    """
+    Benchmark every MySQL node and return a list of result rows.
+
+    Test tables are prepared once on the manager and reach the workers through
+    replication, so the replicas stay consistent. Each (workload, threads) round
+    runs on all eligible nodes at the same time, and the tables are dropped at the end.
+    """
+    nodes = get_nodes()
+    workers = {name: ip for name, ip in nodes.items() if name != 'manager'}
+
+    def install(ip):
+        transfer_file(get_ssh_session(ip), SYSBENCH_SCRIPT, REMOTE_SCRIPT_PATH)
+        run_node_script(ip, 'install')
+
+    _, failed = run_phase(nodes, install, max_parallel)
+    if 'manager' in failed:
+        raise RuntimeError("Sysbench could not be installed on the manager")
+    nodes = {name: ip for name, ip in nodes.items() if name not in failed}
+    workers = {name: ip for name, ip in workers.items() if name not in failed}
+
+    report = []
+    try:
+        # Any workload's prepare creates the same sbtest tables
+        output = run_node_script(nodes['manager'], 'prepare', workload=workloads[0], tables=tables, table_size=table_size)
+        gtid_set = output.strip().splitlines()[-1].strip()
+        _, failed = run_phase(workers, lambda ip: run_node_script(ip, 'wait', gtid_set=gtid_set), max_parallel)
+        workers = {name: ip for name, ip in workers.items() if name not in failed}
+
+        for workload in workloads:
+            targets = {'manager': nodes['manager']} if workload in WRITE_WORKLOADS else {'manager': nodes['manager'], **workers}
+            for threads in thread_counts:
+                logger.info(f"Running {workload} with {threads} threads on {sorted(targets)}")
+                results, failed = run_phase(
+                    targets,
+                    lambda ip: run_node_script(ip, 'run', workload, threads, duration, tables, table_size),
+                    max_parallel
+                )
+                for name in targets:
+                    row = {'node': name, 'host': targets[name], 'workload': workload, 'threads': threads}
+                    if name in failed:
+                        row['error'] = 'run failed'
+                    else:
+                        row.update(parse_sysbench_output(results[name]))
+                    report.append(row)
+    finally:
+        # Also drops a partly prepared database; a cleanup error must not hide the original one
+        try:
+            run_node_script(nodes['manager'], 'cleanup')
+        except Exception as e:
+            logger.error(f"Failed to drop the sysbench tables on the manager: {e}")
+    return report
+
+def print_report(report):
+    """Print results side by side for comparison across nodes."""
+    header = f"{'workload':22s} {'threads':>7s} {'node':10s} {'tps':>10s} {'qps':>11s} {'avg ms':>8s} {'p95 ms':>8s}"
+    print(header)
+    print('-' * len(header))
+    for row in sorted(report, key=lambda row: (row['workload'], row['threads'], row['node'])):
+        if 'error' in row:
+            print(f"{row['workload']:22s} {row['threads']:>7d} {row['node']:10s} {row['error']}")
+            continue
+        fmt = lambda value, spec: format(value, spec) if value is not None else '-'
+        print(f"{row['workload']:22s} {row['threads']:>7d} {row['node']:10s} "
+              f"{fmt(row['transactions_per_sec'], '>10.1f')} {fmt(row['queries_per_sec'], '>11.1f')} "
+              f"{fmt(row['latency_avg_ms'], '>8.2f')} {fmt(row['latency_p95_ms'], '>8.2f')}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run sysbench on every MySQL node and collect a single report')
+    parser.add_argument('--workloads', nargs='+', default=DEFAULT_WORKLOADS, help='Sysbench Lua workloads to run')
+    parser.add_argument('--threads', nargs='+', type=int, default=DEFAULT_THREADS, help='Thread counts to run each workload with')
+    parser.add_argument('--time', type=int, default=DEFAULT_DURATION, help='Seconds per run')
+    parser.add_argument('--tables', type=int, default=DEFAULT_TABLES, help='Number of test tables')
+    parser.add_argument('--table-size', type=int, default=DEFAULT_TABLE_SIZE, help='Rows per test table')
+    parser.add_argument('--report', default=REPORT_FILE, help='Where to write the JSON report')
+    parser.add_argument('--max-parallel', type=int, default=MAX_PARALLEL_HOSTS, help='Maximum number of nodes benchmarked concurrently')
+    args = parser.parse_args()
+
+    try:
+        report = benchmark_cluster(args.workloads, args.threads, args.time, args.tables, args.table_size, args.max_parallel)
+    finally:
+        close_ssh_sessions()
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=4)
+    logger.info(f"Sysbench report saved to '{args.report}'.")
+    print_report(report)
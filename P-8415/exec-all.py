@@ -1,60 +1,186 @@
 import subprocess
 import logging
 import datetime
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Configure logging
 timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 log_filename = f'automation_log_{timestamp}.log'
 
 logging.basicConfig(
-    filename=log_filename,
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler(log_filename), logging.StreamHandler()]
 )
 
 logger = logging.getLogger()
 
-def run_script(script_name, *args):
+# Completed steps are recorded here so a rerun resumes after the last success
+STATE_FILE = 'pipeline_state.json'
+STATE_LOCK = threading.Lock()
+
+# Pipeline steps: script, its arguments and the steps that must finish first.
+# Steps whose dependencies are all done run concurrently; optional steps only run when requested.
+PIPELINE = {
+    'aws_resources': {
+        'script': 'instances_deploy.py',
+        'args': ['--setup-aws-resources'],
+        'deps': [],
+    },
+    'create_instances': {
+        'script': 'instances_deploy.py',
+        'args': ['--create-instances'],
+        'deps': ['aws_resources'],
+    },
+    'instances_info': {
+        'script': 'instances-info.py',  # Generates instance information
+        'args': [],
+        'deps': ['create_instances'],
+    },
+    'setup_databases': {
+        'script': 'instances_setup.py',  # Sets up the manager and workers
+        'args': ['--only', 'database'],
+        'deps': ['instances_info'],
+    },
+    'setup_applications': {
+        'script': 'instances_setup.py',  # Sets up proxy, gatekeeper and trusted host
+        'args': ['--only', 'application'],
+        'deps': ['instances_info'],
+    },
+    'sysbench': {
+        'script': 'db_benchmark.py',  # Benchmarks every MySQL node into one report
+        'args': [],
+        'deps': ['setup_databases'],
+        'optional': True,
+    },
+}
+
+def load_state():
+    """Return the saved pipeline state, or an empty one."""
+    if not os.path.isfile(STATE_FILE):
+        return {'completed': {}}
+    with open(STATE_FILE, 'r') as f:
+        return json.load(f)
+
+def mark_completed(state, step):
+    """Record a finished step on disk immediately, so a crash later does not lose it."""
+    with STATE_LOCK:
+        state['completed'][step] = datetime.datetime.now().isoformat()
+        with open(STATE_FILE, 'w') as f:
+            json.dump(state, f, indent=4)
+
+def dependents_of(step):
+    """Return a step and every step that transitively depends on it."""
+    steps = {step}
+    changed = True
+    while changed:
+        changed = False
+        for name, config in PIPELINE.items():
+            if name not in steps and steps.intersection(config['deps']):
+                steps.add(name)
+                changed = True
+    return steps
+
+def stream_output(pipe, step, level):
+    """Forward a child's output to the log line by line as it is produced."""
+    for line in pipe:
+        logger.log(level, f"[{step}] {line.rstrip()}")
+    pipe.close()
+
+def run_script(step, script_name, *args):
     """
-    Runs a Python script with optional arguments and logs the output.
+    Runs a Python script with optional arguments and streams its output to the log.
 
+    :param step: Pipeline step name, used to prefix log lines.
     :param script_name: Name of the script to run.
     :param args: Additional arguments for the script.
     """
     logger.info(f"Starting {script_name} with arguments: {args}")
-    try:
-        command = ['python', script_name] + list(args)
-        result = subprocess.run(
-            command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        logger.info(f"{script_name} completed successfully.")
-        logger.info(f"Output:\n{result.stdout}")
-        if result.stderr:
-            logger.warning(f"Warnings/Errors from {script_name}:\n{result.stderr}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"{script_name} failed with return code {e.returncode}")
-        logger.error(f"Error output:\n{e.stderr}")
-        exit(1)  # Exit if a critical script fails
-
-def main():
+    command = ['python', '-u', script_name] + list(args)
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1
+    )
+    readers = [
+        threading.Thread(target=stream_output, args=(process.stdout, step, logging.INFO)),
+        threading.Thread(target=stream_output, args=(process.stderr, step, logging.WARNING)),
+    ]
+    for reader in readers:
+        reader.start()
+    returncode = process.wait()
+    for reader in readers:
+        reader.join()
+    if returncode != 0:
+        logger.error(f"{script_name} failed with return code {returncode}")
+        raise subprocess.CalledProcessError(returncode, command)
+    logger.info(f"{script_name} completed successfully.")
+
+def main(restart=False, from_step=None, with_optional=()):
     """
-    Orchestrates the deployment pipeline by running scripts sequentially.
+    Orchestrates the deployment pipeline, resuming after the last completed step.
+
+    :param with_optional: Names of optional steps to include.
     """
-    # Run `instances_deploy.py` with both arguments
-    run_script('instances_deploy.py', '--create-instances', '--setup-aws-resources')
+    steps = {
+        name: config for name, config in PIPELINE.items()
+        if not config.get('optional') or name in with_optional
+    }
+    state = {'completed': {}} if restart else load_state()
+    if from_step:
+        for step in dependents_of(from_step):
+            state['completed'].pop(step, None)
 
-    # Continue with other scripts
-    scripts_to_run = [
-        'instances-info.py',  # Generates instance information
-        'instances_setup.py'  # Sets up instances 
-    ]
+    done = set(state['completed']) & set(steps)
+    if done:
+        logger.info(f"Resuming; already completed: {sorted(done)}")
+    pending = {name: config for name, config in steps.items() if name not in done}
+    if not pending:
+        logger.info(
+            f"Every step already completed according to {STATE_FILE}. "
+            "Pass --restart to run the whole pipeline again, or --from STEP to rerun part of it."
+        )
+        return
+    running = {}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        while pending or running:
+            if not failed:
+                for name, config in list(pending.items()):
+                    if all(dep in done for dep in config['deps']):
+                        future = executor.submit(run_script, name, config['script'], *config['args'])
+                        running[future] = name
+                        del pending[name]
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    done.add(name)
+                    mark_completed(state, name)
+                except Exception:
+                    # Let steps already running finish, but start nothing new
+                    failed = True
 
-    for script in scripts_to_run:
-        run_script(script)
+    if failed or pending:
+        logger.error(f"Pipeline stopped. Rerun to resume from: {sorted(set(steps) - done)}")
+        exit(1)
+    logger.info("Pipeline completed.")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Run the deployment pipeline, resuming after failures')
+    parser.add_argument('--restart', action='store_true', help='Ignore saved progress and run every step')
+    parser.add_argument('--from', dest='from_step', choices=list(PIPELINE), help='Rerun this step and everything after it')
+    parser.add_argument('--with-sysbench', action='store_true', help='Also benchmark every MySQL node with sysbench')
+    args = parser.parse_args()
+    main(args.restart, args.from_step, ['sysbench'] if args.with_sysbench else [])
@@ -8,13 +8,14 @@ then
 fi
 
 # Execute the Python script
-echo "Starting the Python script 'exec_all.py'..."
-python3 exec_all.py
+echo "Starting the Python script 'exec-all.py'..."
+echo "Completed steps are skipped on rerun; pass --restart to run every step again."
+python3 exec-all.py "$@"
 
 # Check if the script ran successfully
 if [ $? -eq 0 ]; then
-    echo "Script 'exec_all.py' executed successfully!"
+    echo "Script 'exec-all.py' executed successfully!"
 else
-    echo "Script 'exec_all.py' encountered an error."
+    echo "Script 'exec-all.py' encountered an error."
     exit 1
 fi
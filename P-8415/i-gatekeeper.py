@@ -1,8 +1,13 @@
 from flask import Flask, request, jsonify
 import requests
 import json
+import hmac
+import compression
+import tracing
 
 app = Flask(__name__)
+compression.init_app(app)
+tracing.init_app(app, "gatekeeper")
 
 # Load instance details from local file
 CONFIG_FILE_PATH = "/home/ubuntu/instance_details.json"
@@ -24,29 +29,79 @@ load_instance_details()
 TRUSTED_HOST_PRIVATE_IP = INSTANCE_DETAILS['trusted_host']['private_ips'][0]
 TRUSTED_HOST_URL = f"http://{TRUSTED_HOST_PRIVATE_IP}:5000"
 
+# Query deadlines (seconds): the default for requests that set none, and the most one may ask for
+QUERY_TIMEOUTS = INSTANCE_DETAILS["query_timeouts"]
+# Extra time allowed for the downstream hops to report a cancelled query; above the Trusted Host's margin
+HOP_TIMEOUT_MARGIN = 20
+
 # A simple filter for allowed operations
 ALLOWED_OPERATIONS = ["SELECT", "INSERT", "UPDATE", "DELETE", "SET_MODE"]
+# Commands exposing cluster internals (private IPs, binlog positions); they need the admin token
+ADMIN_OPERATIONS = ["REPLICATION_STATUS", "ROUTING_STATS"]
+ADMIN_TOKEN = INSTANCE_DETAILS.get("admin_token")
+# Session and transaction control; statements inside a transaction must still be allowed operations
+SESSION_OPERATIONS = ["OPEN_SESSION", "CLOSE_SESSION", "BEGIN", "START TRANSACTION", "COMMIT", "ROLLBACK"]
 
-@app.route('/filter', methods=['POST'])
-def filter_request():
-    data = request.get_json()
+def validate_request(data):
+    """
+    Check a request against the filter rules and fill in its timeout.
 
-    # Validate request data
+    :return: An error response tuple, or None if the request may be forwarded.
+    """
     if not data or 'query' not in data:
         return jsonify({"error": "Invalid request. Query missing."}), 400
 
     query = data['query'].strip()
     normalized_query = query.upper()  # Normalize query to uppercase for validation
 
+    # Admin commands are refused unless the caller proves it holds instance_details.json
+    if any(normalized_query.startswith(op) for op in ADMIN_OPERATIONS):
+        token = data.pop('admin_token', None)
+        if not ADMIN_TOKEN or not isinstance(token, str) or not hmac.compare_digest(token, ADMIN_TOKEN):
+            app.logger.warning(f"Admin command without a valid token: {query}")
+            return jsonify({"error": f"Operation not allowed: {query}"}), 403
+        data['timeout'] = QUERY_TIMEOUTS['default']
+        return None
+
     # Check if query starts with an allowed operation
-    if not any(normalized_query.startswith(op) for op in ALLOWED_OPERATIONS):
+    if not any(normalized_query.startswith(op) for op in ALLOWED_OPERATIONS + SESSION_OPERATIONS):
         app.logger.warning(f"Disallowed operation detected: {query}")
         return jsonify({"error": f"Operation not allowed: {query}"}), 403
 
+    if 'session' in data and not isinstance(data['session'], str):
+        return jsonify({"error": f"Invalid session: {data['session']!r}"}), 400
+
+    # Every query carries an execution deadline; the proxy cancels it when it expires
+    timeout = data.get('timeout', QUERY_TIMEOUTS['default'])
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+        return jsonify({"error": f"Invalid timeout: {timeout!r}"}), 400
+    data['timeout'] = min(timeout, QUERY_TIMEOUTS['max'])
+    return None
+
+@app.route('/filter', methods=['POST'])
+def filter_request():
+    data = request.get_json()
+
+    # Validate request data
+    with tracing.span("validate"):
+        error = validate_request(data)
+    if error:
+        return error
+    query = data['query'].strip()
+
     # Forward validated query to Trusted Host
     try:
-        response = requests.post(f"{TRUSTED_HOST_URL}/process", json=data)
-        return jsonify(response.json()), response.status_code
+        with tracing.span("forward"):
+            status, body, headers = compression.post_json(
+                f"{TRUSTED_HOST_URL}/process", data,
+                timeout=data['timeout'] + HOP_TIMEOUT_MARGIN,
+                headers=tracing.forward_headers()
+            )
+        tracing.add_downstream_timing(headers)
+        return jsonify(body), status
+    except requests.Timeout:
+        app.logger.error(f"Trusted Host did not answer within {data['timeout']} seconds: {query}")
+        return jsonify({"error": f"Query exceeded its {data['timeout']} second timeout"}), 504
     except Exception as e:
         app.logger.error(f"Error forwarding to Trusted Host: {e}")
         return jsonify({"error": f"Error forwarding to Trusted Host: {e}"}), 500
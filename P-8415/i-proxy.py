@@ -3,31 +3,75 @@ import json
 import pymysql
 import random
 import socket
+import threading
 import time
 import asyncio
+import queue
+import uuid
+from collections import deque
 from cachetools import TTLCache
-from flask import Flask, request
+from flask import Flask, request, jsonify
+import compression
+import tracing
 
 # Configuration
 app = Flask(__name__)
+compression.init_app(app)
+tracing.init_app(app, "proxy", trust_upstream=True)  # Only reachable from the tier above
 mode = "direct_hit"  # Default mode
 INSTANCE_DETAILS = {}
 
 # Load instance details from local file
 CONFIG_FILE_PATH = "/home/ubuntu/instance_details.json"
+CONFIG_WATCH_INTERVAL = 2  # seconds between checks for a changed configuration file
+CONFIG_LOCK = threading.Lock()
+CONFIG_MTIME = None
 
 def load_instance_details():
-    """Load instance details from local configuration file."""
-    global INSTANCE_DETAILS
-    try:
-        with open(CONFIG_FILE_PATH, "r") as f:
-            INSTANCE_DETAILS = json.load(f)
-        app.logger.info("Loaded instance details from local configuration file.")
-    except Exception as e:
-        app.logger.error(f"Failed to load instance details: {e}")
-        raise
+    """
+    Load instance details from local configuration file.
+
+    The global is swapped in one assignment, so requests already routed keep the
+    snapshot they started with while new requests see the new membership.
+    """
+    global INSTANCE_DETAILS, CONFIG_MTIME
+    with CONFIG_LOCK:
+        try:
+            mtime = os.path.getmtime(CONFIG_FILE_PATH)
+            with open(CONFIG_FILE_PATH, "r") as f:
+                details = json.load(f)
+            if not details["manager"]["private_ips"]:
+                raise ValueError("Configuration has no manager")
+            if "query_timeouts" not in details:
+                raise ValueError("Configuration has no query_timeouts")
+            INSTANCE_DETAILS = details
+            CONFIG_MTIME = mtime
+            app.logger.info(f"Loaded instance details from local configuration file. Workers: {details['worker']['private_ips']}")
+        except Exception as e:
+            app.logger.error(f"Failed to load instance details: {e}")
+            raise
 
-def connect_to_db(config):
+def watch_instance_details():
+    """Reload instance details whenever the configuration file changes on disk."""
+    while True:
+        time.sleep(CONFIG_WATCH_INTERVAL)
+        try:
+            if os.path.getmtime(CONFIG_FILE_PATH) != CONFIG_MTIME:
+                load_instance_details()
+        except Exception:
+            # Keep serving with the last good configuration; the error is already logged
+            pass
+
+# Query deadlines come from the "query_timeouts" section of the configuration file.
+# The deadline counts from when a request arrives, so routing and connecting use it up too.
+# If KILL QUERY cannot be delivered, the read timeout is the backstop: the proxy answers within
+# LATENCY_PROBE_TIMEOUT + CONNECT_TIMEOUT + deadline + READ_TIMEOUT_GRACE (12 s past the deadline),
+# which the Trusted Host's HOP_TIMEOUT_MARGIN must exceed.
+CONNECT_TIMEOUT = 5  # seconds to establish a MySQL connection
+READ_TIMEOUT_GRACE = 5  # Socket read timeout beyond the deadline, in case KILL QUERY cannot be delivered
+LATENCY_PROBE_TIMEOUT = 2  # seconds before a worker is treated as unreachable in customized mode
+
+def connect_to_db(config, read_timeout=None):
     """Establish a connection to a MySQL instance."""
     try:
         return pymysql.connect(
@@ -37,11 +81,70 @@ def connect_to_db(config):
             database=INSTANCE_DETAILS["db_details"]["db_name"],
             port=INSTANCE_DETAILS["db_details"]["port"],
             cursorclass=pymysql.cursors.DictCursor,
+            connect_timeout=CONNECT_TIMEOUT,
+            read_timeout=read_timeout,
         )
     except pymysql.MySQLError as e:
         app.logger.error(f"Database connection failed: {e}")
         raise
 
+def get_query_timeout(data):
+    """
+    Return the execution deadline requested for a query, capped at the configured maximum.
+
+    :raises ValueError: If the requested timeout is not a positive number.
+    """
+    timeouts = INSTANCE_DETAILS["query_timeouts"]
+    timeout = data.get("timeout", timeouts["default"])
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+        raise ValueError(f"Invalid timeout: {timeout!r}")
+    return min(timeout, timeouts["max"])
+
+def kill_query(connection, timed_out):
+    """Cancel the statement running on a connection with KILL QUERY from a second connection."""
+    timed_out.set()
+    try:
+        killer = connect_to_db({"host": connection.host})
+        try:
+            with killer.cursor() as cursor:
+                cursor.execute(f"KILL QUERY {int(connection.thread_id())}")
+        finally:
+            killer.close()
+        app.logger.warning(f"Killed query on {connection.host} thread {connection.thread_id()} after timeout")
+    except Exception as e:
+        app.logger.error(f"Failed to kill query on {connection.host}: {e}")
+
+def is_connection_error(error):
+    """Tell whether a MySQL error means the connection itself failed (client codes 2000-2999)."""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    code = error.args[0] if error.args and isinstance(error.args[0], int) else None
+    return code is not None and 2000 <= code < 3000
+
+def get_master_position(connection):
+    """Return the binlog coordinates reached by the given manager connection."""
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW MASTER STATUS")
+        status = cursor.fetchone()
+    if not status:
+        return None
+    return {"file": status["File"], "position": status["Position"]}
+
+def get_worker_position(connection):
+    """Return the manager binlog coordinates a worker has applied so far."""
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    if not status:
+        return None
+    return {
+        "file": status["Relay_Master_Log_File"],
+        "position": status["Exec_Master_Log_Pos"],
+        "seconds_behind_master": status["Seconds_Behind_Master"],
+        "io_running": status["Slave_IO_Running"],
+        "sql_running": status["Slave_SQL_Running"],
+    }
+
 def parse_query(query):
     """Determine if the query is a read or write operation."""
     query = query.strip().lower()
@@ -53,18 +156,24 @@ def parse_query(query):
         return 'UPDATE'
     elif query.startswith('delete'):
         return 'DELETE'
+    elif query.startswith('begin') or query.startswith('start transaction'):
+        return 'BEGIN'
+    elif query.startswith('commit'):
+        return 'COMMIT'
+    elif query.startswith('rollback'):
+        return 'ROLLBACK'
     else:
         return 'OTHER'
 
 # Caching latencies to avoid frequent recalculations
-LATENCY_CACHE = TTLCache(maxsize=10, ttl=10)
+LATENCY_CACHE = TTLCache(maxsize=256, ttl=10)  # Room for every worker as the cluster scales out
 
 async def measure_latency_async(host, port=3306):
     """Asynchronously measure TCP latency to a host."""
     loop = asyncio.get_event_loop()
     try:
         start = loop.time()
-        await loop.run_in_executor(None, lambda: socket.create_connection((host, port), timeout=2))
+        await loop.run_in_executor(None, lambda: socket.create_connection((host, port), timeout=LATENCY_PROBE_TIMEOUT))
         return loop.time() - start
     except Exception:
         return None  # Return None for unreachable hosts
@@ -97,59 +206,460 @@ async def get_best_worker_latency_only(worker_configs):
     best_worker_host = min(available_workers, key=available_workers.get)
     return next(worker for worker in worker_configs if worker["host"] == best_worker_host)
 
-async def route_query(query):
-    """Route the query based on the mode and type of operation."""
+# Adaptive mode: an epsilon-greedy bandit over the fixed read strategies
+READ_STRATEGIES = ["direct_hit", "random", "customized"]
+ADAPTIVE_EXPLORE_RATE = 0.1  # Share of reads sent to a random strategy to keep measuring it
+ADAPTIVE_EWMA_ALPHA = 0.2  # Weight of the newest sample in each strategy's latency average
+ADAPTIVE_ERROR_PENALTY = 1.0  # Latency (seconds) charged for a failed read
+ADAPTIVE_THROUGHPUT_WINDOW = 10  # seconds of completions used to report throughput
+ADAPTIVE_LOCK = threading.Lock()
+ADAPTIVE_STATS = {
+    strategy: {"requests": 0, "errors": 0, "ewma_latency": None, "completions": deque()}
+    for strategy in READ_STRATEGIES
+}
+ADAPTIVE_DECISIONS = deque(maxlen=50)  # Recent (time, strategy, explored) choices for inspection
+
+def choose_adaptive_strategy():
+    """Pick the read strategy with the lowest average latency, exploring the others now and then."""
+    with ADAPTIVE_LOCK:
+        untried = [strategy for strategy in READ_STRATEGIES if ADAPTIVE_STATS[strategy]["ewma_latency"] is None]
+        if untried:
+            strategy, explored = untried[0], True
+        elif random.random() < ADAPTIVE_EXPLORE_RATE:
+            strategy, explored = random.choice(READ_STRATEGIES), True
+        else:
+            strategy = min(READ_STRATEGIES, key=lambda name: ADAPTIVE_STATS[name]["ewma_latency"])
+            explored = False
+        ADAPTIVE_DECISIONS.append((time.time(), strategy, explored))
+    return strategy
+
+def is_backend_failure(error, timed_out):
+    """
+    Tell whether a failed read reflects on the server it was routed to rather than on the query.
+
+    Timeouts, routing failures and client-side connection errors (codes 2000-2999, such as
+    a refused or lost connection) count; errors the server reports about the SQL do not.
+    """
+    return timed_out or not isinstance(error, pymysql.MySQLError) or is_connection_error(error)
+
+def record_adaptive_result(strategy, latency, success):
+    """Feed one read's end-to-end latency (connect, execute, fetch) back into the bandit."""
+    if not success:
+        latency = max(latency, ADAPTIVE_ERROR_PENALTY)
+    now = time.time()
+    with ADAPTIVE_LOCK:
+        stats = ADAPTIVE_STATS[strategy]
+        stats["requests"] += 1
+        stats["errors"] += 0 if success else 1
+        if stats["ewma_latency"] is None:
+            stats["ewma_latency"] = latency
+        else:
+            stats["ewma_latency"] += ADAPTIVE_EWMA_ALPHA * (latency - stats["ewma_latency"])
+        stats["completions"].append(now)
+        while stats["completions"] and stats["completions"][0] < now - ADAPTIVE_THROUGHPUT_WINDOW:
+            stats["completions"].popleft()
+
+async def route_query(query, read_timeout=None, strategy=None):
+    """
+    Route the query based on the mode and type of operation.
+
+    :param strategy: Read strategy to use instead of the global mode (used by adaptive mode).
+    """
+    with tracing.span("route"):
+        connection_config = await select_backend(query, strategy)
+    with tracing.span("connect"):
+        return connect_to_db(connection_config, read_timeout=read_timeout)
+
+async def select_backend(query, strategy=None):
+    """Return the connection config of the server a query should run on."""
     query_type = parse_query(query)
     app.logger.debug(f"Parsed query type: {query_type}")
+    details = INSTANCE_DETAILS  # One consistent view even if membership is reloaded meanwhile
     manager_config = {
-        "host": INSTANCE_DETAILS["manager"]["private_ips"][0],
-        "port": INSTANCE_DETAILS["db_details"]["port"],
+        "host": details["manager"]["private_ips"][0],
+        "port": details["db_details"]["port"],
     }
     worker_configs = [
-        {"host": worker, "port": INSTANCE_DETAILS["db_details"]["port"]}
-        for worker in INSTANCE_DETAILS["worker"]["private_ips"]
+        {"host": worker, "port": details["db_details"]["port"]}
+        for worker in details["worker"]["private_ips"]
     ]
 
     if query_type == "SELECT":  # READ operations
-        if mode == "direct_hit":
+        read_mode = strategy or mode
+        if read_mode == "direct_hit":
             connection_config = manager_config
-        elif mode == "random":
+        elif not worker_configs:
+            app.logger.warning("No workers registered; routing SELECT query to manager")
+            connection_config = manager_config
+        elif read_mode == "random":
             connection_config = random.choice(worker_configs)
-        elif mode == "customized":
+        elif read_mode == "customized":
             connection_config = await get_best_worker_latency_only(worker_configs)
+        elif read_mode == "adaptive":
+            raise ValueError("Adaptive mode needs a read strategy chosen by the caller")
         else:
-            raise ValueError(f"Unknown mode: {mode}")
+            raise ValueError(f"Unknown mode: {read_mode}")
         app.logger.info(f"Routing SELECT query to worker: {connection_config['host']}")
     else:  # WRITE and DDL operations
         app.logger.info(f"Routing query of type '{query_type}' to manager")
         connection_config = manager_config
 
-    return connect_to_db(connection_config)
+    return connection_config
+
+# Client sessions: a transaction opened with BEGIN keeps one manager connection until COMMIT/ROLLBACK
+SESSION_IDLE_TIMEOUT = 300  # seconds a session may sit unused before it is reaped
+SESSION_REAP_INTERVAL = 10  # seconds between sweeps for idle sessions
+MANAGER_POOL_SIZE = 8  # Idle manager connections kept for reuse by transactions
+SESSIONS_LOCK = threading.Lock()
+SESSIONS = {}
+MANAGER_POOL = queue.LifoQueue(maxsize=MANAGER_POOL_SIZE)
+
+def get_manager_connection():
+    """Take an idle manager connection from the pool, or open a new one."""
+    details = INSTANCE_DETAILS
+    manager_host = details["manager"]["private_ips"][0]
+    while True:
+        try:
+            connection = MANAGER_POOL.get_nowait()
+        except queue.Empty:
+            break
+        # Drop connections to a previous manager and ones the server has closed
+        if connection.host == manager_host:
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except pymysql.MySQLError:
+                pass
+        connection.close()
+    return connect_to_db(
+        {"host": manager_host, "port": details["db_details"]["port"]},
+        read_timeout=details["query_timeouts"]["default"] + READ_TIMEOUT_GRACE,
+    )
+
+def set_read_timeout(connection, read_timeout):
+    """
+    Change the socket read timeout of an open connection.
+
+    Pooled connections serve statements with different deadlines; pymysql applies
+    _read_timeout to the socket before every read, so updating it is enough.
+    """
+    connection._read_timeout = read_timeout
+
+def release_manager_connection(connection):
+    """Return a connection with no open transaction to the pool, closing it if the pool is full."""
+    try:
+        MANAGER_POOL.put_nowait(connection)
+    except queue.Full:
+        connection.close()
+
+def discard_transaction(session):
+    """Roll back and close a session's pinned connection, e.g. when it is reaped or broken."""
+    session["aborted"] = False
+    connection, session["connection"] = session["connection"], None
+    if connection is None:
+        return
+    try:
+        connection.rollback()
+    except Exception:
+        pass
+    connection.close()
+
+def reap_idle_sessions():
+    """Close sessions, and roll back their transactions, once they have been idle too long."""
+    while True:
+        time.sleep(SESSION_REAP_INTERVAL)
+        cutoff = time.time() - SESSION_IDLE_TIMEOUT
+        with SESSIONS_LOCK:
+            idle = [token for token, session in SESSIONS.items() if session["last_used"] < cutoff]
+        for token in idle:
+            with SESSIONS_LOCK:
+                session = SESSIONS.get(token)
+                # Skip sessions that are running a statement or were used since the scan
+                if session is None or session["last_used"] >= cutoff or not session["lock"].acquire(blocking=False):
+                    continue
+                del SESSIONS[token]
+            try:
+                if session["connection"] is not None:
+                    app.logger.warning(f"Rolling back transaction of idle session {token}")
+                discard_transaction(session)
+            finally:
+                session["lock"].release()
+            app.logger.info(f"Reaped idle session {token}")
+
+def run_in_transaction(session, query, query_type, timeout):
+    """
+    Run a statement of a session's transaction on its pinned manager connection.
+
+    BEGIN pins a pooled connection, COMMIT and ROLLBACK end the transaction and return
+    it to the pool, and statements in between are neither routed nor committed.
+    After an error that may have cost the transaction its earlier statements (a
+    deadlock, lock wait timeout or lost connection) the session is marked aborted:
+    every statement is refused until the client sends ROLLBACK, and COMMIT rolls back.
+
+    :return: Response body and status code.
+    """
+    if query_type == "BEGIN":
+        if session["connection"] is not None or session["aborted"]:
+            return {"error": "Session already has an open transaction"}, 409
+        connection = get_manager_connection()
+        try:
+            set_read_timeout(connection, timeout + READ_TIMEOUT_GRACE)
+            connection.begin()
+        except Exception:
+            connection.close()  # Not pinned yet, so nothing else would close it
+            raise
+        session["connection"] = connection
+        app.logger.info("Transaction started")
+        return {"status": "transaction started"}, 200
+
+    connection = session["connection"]
+    if query_type in ("COMMIT", "ROLLBACK"):
+        if session["aborted"]:
+            discard_transaction(session)
+            if query_type == "COMMIT":
+                return {"error": "Transaction was aborted by an earlier error and has been rolled back"}, 409
+            return {"status": "rolled back"}, 200
+        if connection is None:
+            return {"error": "Session has no open transaction"}, 409
+        set_read_timeout(connection, timeout + READ_TIMEOUT_GRACE)
+        with tracing.span("execute"):
+            if query_type == "COMMIT":
+                connection.commit()
+            else:
+                connection.rollback()
+        session["connection"] = None
+        release_manager_connection(connection)
+        app.logger.info(f"Transaction ended with {query_type}")
+        return {"status": "committed" if query_type == "COMMIT" else "rolled back"}, 200
+
+    if session["aborted"]:
+        return {"error": "Transaction was aborted by an earlier error; send ROLLBACK"}, 409
+
+    # The read timeout is only a backstop for this statement's deadline, as for routed queries
+    set_read_timeout(connection, timeout + READ_TIMEOUT_GRACE)
+    timed_out = threading.Event()
+    timer = threading.Timer(timeout, kill_query, args=(connection, timed_out))
+    timer.daemon = True
+    timer.start()
+    try:
+        with connection.cursor() as cursor:
+            with tracing.span("execute"):
+                cursor.execute(query)
+                results = cursor.fetchall() if cursor.description else None
+        if results is not None:
+            with tracing.span("serialize"):
+                return jsonify({"results": results}), 200
+        return {"status": "success", "rows_affected": cursor.rowcount}, 200
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+        if is_connection_error(e):
+            # The connection is gone, and the transaction with it
+            discard_transaction(session)
+        elif timed_out.is_set():
+            # KILL QUERY only cancels the statement; the transaction stays usable
+            app.logger.error(f"Query timed out after {timeout} seconds in transaction: {query}")
+            return {"error": f"Query exceeded its {timeout} second timeout and was cancelled"}, 504
+        # Deadlocks roll the transaction back and lock wait timeouts leave it half done;
+        # either way the client must not carry on as if every earlier statement still applied
+        session["aborted"] = True
+        app.logger.error(f"Transaction aborted by error: {e}")
+        if timed_out.is_set():
+            return {"error": f"Query exceeded its {timeout} second timeout; transaction aborted"}, 504
+        return {"error": f"Transaction aborted, send ROLLBACK: {e}"}, 500
+    except Exception as e:
+        app.logger.error(f"Error handling query in transaction: {query}, Error: {e}")
+        return {"error": str(e)}, 500
+    finally:
+        timer.cancel()
+
+@app.route("/open_session", methods=["POST"])
+def open_session():
+    """Create a session token that clients pass back to run multi-statement transactions."""
+    token = uuid.uuid4().hex
+    with SESSIONS_LOCK:
+        SESSIONS[token] = {"connection": None, "aborted": False, "last_used": time.time(), "lock": threading.Lock()}
+    app.logger.info(f"Opened session {token}")
+    return {"session": token, "idle_timeout": SESSION_IDLE_TIMEOUT}
+
+@app.route("/close_session", methods=["POST"])
+def close_session():
+    """Close a session, rolling back any transaction it left open."""
+    token = request.json.get("session")
+    with SESSIONS_LOCK:
+        session = SESSIONS.pop(token, None)
+    if session is None:
+        return {"error": f"Unknown session: {token}"}, 404
+    with session["lock"]:
+        rolled_back = session["connection"] is not None
+        discard_transaction(session)
+    app.logger.info(f"Closed session {token}")
+    return {"status": "closed", "rolled_back": rolled_back}
 
 @app.route("/query", methods=["POST"])
 def handle_query():
     query = request.json.get("query")
+    if not isinstance(query, str):
+        return {"error": "Invalid request. Query missing."}, 400
+    track_replication = request.json.get("track_replication", False)
+    try:
+        timeout = get_query_timeout(request.json)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    token = request.json.get("session")
+    query_type = parse_query(query)
+    if token is not None:
+        with SESSIONS_LOCK:
+            session = SESSIONS.get(token)
+        if session is None:
+            return {"error": f"Unknown or expired session: {token}"}, 404
+        with session["lock"]:
+            # The reaper or CLOSE_SESSION may have removed the session while we waited for it
+            with SESSIONS_LOCK:
+                if SESSIONS.get(token) is not session:
+                    return {"error": f"Unknown or expired session: {token}"}, 404
+            session["last_used"] = time.time()
+            in_transaction = session["connection"] is not None or session["aborted"]
+            if in_transaction or query_type in ("BEGIN", "COMMIT", "ROLLBACK"):
+                app.logger.info(f"Received query for session {token}: {query}")
+                try:
+                    return run_in_transaction(session, query, query_type, timeout)
+                except Exception as e:
+                    app.logger.error(f"Error handling transaction control: {query}, Error: {e}")
+                    # A failed COMMIT or ROLLBACK leaves the outcome unknown; make the client roll back
+                    was_pinned = session["connection"] is not None
+                    discard_transaction(session)
+                    session["aborted"] = was_pinned
+                    return {"error": str(e)}, 500
+                finally:
+                    session["last_used"] = time.time()
+    elif query_type in ("BEGIN", "COMMIT", "ROLLBACK"):
+        return {"error": f"{query_type} requires a session; open one with OPEN_SESSION"}, 400
+
+    connection = None
+    timer = None
+    timed_out = threading.Event()
+    # In adaptive mode, pick the read strategy here so its outcome can be credited to it;
+    # otherwise pin the current mode so a concurrent SET_MODE cannot change it mid-request
+    adaptive = mode == "adaptive" and query_type == "SELECT"
+    strategy = choose_adaptive_strategy() if adaptive else mode
+    start = time.perf_counter()
+    succeeded = False
+    backend_failed = False
     try:
         app.logger.info(f"Received query: {query}")
-        connection = asyncio.run(route_query(query))  # Use asyncio to handle asynchronous routing
+        # Use asyncio to handle asynchronous routing
+        connection = asyncio.run(route_query(query, read_timeout=timeout + READ_TIMEOUT_GRACE, strategy=strategy))
+        # Routing and connecting count towards the deadline; the statement gets what is left
+        remaining = start + timeout - time.perf_counter()
+        if remaining <= 0:
+            timed_out.set()
+            raise TimeoutError("Deadline passed before the query could start")
+        timer = threading.Timer(remaining, kill_query, args=(connection, timed_out))
+        timer.daemon = True
+        timer.start()
         with connection.cursor() as cursor:
-            cursor.execute(query)
-            if cursor.description:  # SELECT queries return results
-                results = cursor.fetchall()
+            with tracing.span("execute"):
+                cursor.execute(query)
+                if cursor.description:  # SELECT queries return results
+                    results = cursor.fetchall()
+                else:  # Other queries commit changes
+                    results = None
+                    connection.commit()
+            if results is not None:
+                succeeded = True
                 app.logger.info(f"Query successful. Results: {results}")
-                return {"results": results}
-            else:  # Other queries commit changes
-                connection.commit()
-                app.logger.info("Query successful. Changes committed.")
-                return {"status": "success"}
+                with tracing.span("serialize"):
+                    return jsonify({"results": results})
+            app.logger.info("Query successful. Changes committed.")
+            if track_replication:
+                # Coordinates after our commit; a worker that reached them has this write
+                return {"status": "success", "binlog": get_master_position(connection)}
+            return {"status": "success"}
     except Exception as e:
+        backend_failed = is_backend_failure(e, timed_out.is_set())
+        if timed_out.is_set():
+            app.logger.error(f"Query timed out after {timeout} seconds: {query}")
+            return {"error": f"Query exceeded its {timeout} second timeout and was cancelled"}, 504
         app.logger.error(f"Error handling query: {query}, Error: {e}")
         return {"error": str(e)}, 500
+    finally:
+        if timer:
+            timer.cancel()
+        if connection:
+            connection.close()
+        # A bad query says nothing about the strategy, so only successes and backend failures count
+        if adaptive and (succeeded or backend_failed):
+            record_adaptive_result(strategy, time.perf_counter() - start, succeeded)
+
+@app.route("/replication_status", methods=["GET"])
+def replication_status():
+    """Report the manager binlog position and how far each worker has applied it."""
+    details = INSTANCE_DETAILS
+    port = details["db_details"]["port"]
+    try:
+        connection = connect_to_db({"host": details["manager"]["private_ips"][0], "port": port})
+        try:
+            manager = get_master_position(connection)
+        finally:
+            connection.close()
+
+        workers = {}
+        for worker in details["worker"]["private_ips"]:
+            try:
+                connection = connect_to_db({"host": worker, "port": port})
+                try:
+                    workers[worker] = get_worker_position(connection)
+                finally:
+                    connection.close()
+            except Exception as e:
+                app.logger.warning(f"Could not read replication status from {worker}: {e}")
+                workers[worker] = None
+        return {"manager": manager, "workers": workers}
+    except Exception as e:
+        app.logger.error(f"Error reading replication status: {e}")
+        return {"error": str(e)}, 500
+
+@app.route("/reload", methods=["POST"])
+def reload_config():
+    """Re-read backend membership from the configuration file without restarting."""
+    try:
+        load_instance_details()
+    except Exception as e:
+        return {"error": f"Reload failed, keeping previous configuration: {e}"}, 500
+    return {"status": "reloaded", "workers": INSTANCE_DETAILS["worker"]["private_ips"]}
+
+@app.route("/adaptive_stats", methods=["GET"])
+def adaptive_stats():
+    """Expose what adaptive mode has measured and which strategy it currently favours."""
+    now = time.time()
+    with ADAPTIVE_LOCK:
+        strategies = {}
+        for strategy, stats in ADAPTIVE_STATS.items():
+            recent = [t for t in stats["completions"] if t >= now - ADAPTIVE_THROUGHPUT_WINDOW]
+            strategies[strategy] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "ewma_latency": stats["ewma_latency"],
+                "throughput": len(recent) / ADAPTIVE_THROUGHPUT_WINDOW,
+            }
+        measured = [name for name in READ_STRATEGIES if ADAPTIVE_STATS[name]["ewma_latency"] is not None]
+        best = min(measured, key=lambda name: ADAPTIVE_STATS[name]["ewma_latency"]) if measured else None
+        decisions = [
+            {"time": decided_at, "strategy": strategy, "explored": explored}
+            for decided_at, strategy, explored in ADAPTIVE_DECISIONS
+        ]
+    return {
+        "mode": mode,
+        "best_strategy": best,
+        "explore_rate": ADAPTIVE_EXPLORE_RATE,
+        "strategies": strategies,
+        "recent_decisions": decisions,
+    }
 
 @app.route("/set_mode/<new_mode>", methods=["POST"])
 def set_mode(new_mode):
     global mode
-    if new_mode not in ["direct_hit", "random", "customized"]:
+    if new_mode not in READ_STRATEGIES + ["adaptive"]:
         return {"error": "Invalid mode"}, 400
     mode = new_mode
     app.logger.info(f"Mode set to {new_mode}")
@@ -158,4 +668,6 @@ def set_mode(new_mode):
 if __name__ == "__main__":
     # Load instance details before starting the app
     load_instance_details()
+    threading.Thread(target=watch_instance_details, daemon=True).start()
+    threading.Thread(target=reap_idle_sessions, daemon=True).start()
     app.run(host="0.0.0.0", port=5000)
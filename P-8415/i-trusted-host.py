@@ -1,8 +1,12 @@
 from flask import Flask, request, jsonify
 import requests
 import json
+import compression
+import tracing
 
 app = Flask(__name__)
+compression.init_app(app)
+tracing.init_app(app, "trusted_host", trust_upstream=True)  # Only reachable from the tier above
 
 # Load instance details from local file
 CONFIG_FILE_PATH = "/home/ubuntu/instance_details.json"
@@ -24,6 +28,24 @@ load_instance_details()
 PROXY_PRIVATE_IP = INSTANCE_DETAILS['proxy']['private_ips'][0]
 PROXY_URL = f"http://{PROXY_PRIVATE_IP}:5000"
 
+# Query deadlines (seconds): the default for requests that set none, and the most one may ask for
+QUERY_TIMEOUTS = INSTANCE_DETAILS["query_timeouts"]
+# Extra time allowed for the proxy to report a cancelled query; above the proxy's worst case
+# (12 s past the deadline when KILL QUERY fails) and below the Gatekeeper's margin
+HOP_TIMEOUT_MARGIN = 15
+
+# Admin commands answered by a Proxy GET endpoint
+ADMIN_COMMANDS = {
+    "REPLICATION_STATUS": "/replication_status",
+    "ROUTING_STATS": "/adaptive_stats",
+}
+
+# Session commands answered by a Proxy POST endpoint; the session token travels in the body
+SESSION_COMMANDS = {
+    "OPEN_SESSION": "/open_session",
+    "CLOSE_SESSION": "/close_session",
+}
+
 @app.route('/process', methods=['POST'])
 def process_request():
     data = request.get_json()
@@ -33,16 +55,47 @@ def process_request():
     if query.upper().startswith("SET_MODE"):
         mode = query.split()[-1]
         try:
-            response = requests.post(f"{PROXY_URL}/set_mode/{mode}")
+            response = requests.post(f"{PROXY_URL}/set_mode/{mode}", timeout=QUERY_TIMEOUTS['default'])
             return jsonify(response.json()), response.status_code
         except Exception as e:
             app.logger.error(f"Error processing SET_MODE command: {e}")
             return jsonify({"error": str(e)}), 500
 
-    # Forward SQL queries to the Proxy
+    # Handle read-only admin commands
+    command = query.split()[0].upper() if query else ''
+    if command in ADMIN_COMMANDS:
+        try:
+            response = requests.get(f"{PROXY_URL}{ADMIN_COMMANDS[command]}", timeout=QUERY_TIMEOUTS['default'])
+            return jsonify(response.json()), response.status_code
+        except Exception as e:
+            app.logger.error(f"Error processing {command} command: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    if command in SESSION_COMMANDS:
+        try:
+            status, body, _ = compression.post_json(
+                f"{PROXY_URL}{SESSION_COMMANDS[command]}", {"session": data.get('session')},
+                timeout=QUERY_TIMEOUTS['default'], headers=tracing.forward_headers()
+            )
+            return jsonify(body), status
+        except Exception as e:
+            app.logger.error(f"Error processing {command} command: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    # Forward SQL queries to the Proxy, keeping any per-request options such as the timeout
+    timeout = data.get('timeout', QUERY_TIMEOUTS['default'])
     try:
-        response = requests.post(f"{PROXY_URL}/query", json={"query": query})
-        return jsonify(response.json()), response.status_code
+        with tracing.span("forward"):
+            status, body, headers = compression.post_json(
+                f"{PROXY_URL}/query", {**data, "query": query, "timeout": timeout},
+                timeout=timeout + HOP_TIMEOUT_MARGIN,
+                headers=tracing.forward_headers()
+            )
+        tracing.add_downstream_timing(headers)
+        return jsonify(body), status
+    except requests.Timeout:
+        app.logger.error(f"Proxy did not answer within {timeout} seconds: {query}")
+        return jsonify({"error": f"Query exceeded its {timeout} second timeout"}), 504
     except Exception as e:
         app.logger.error(f"Error forwarding query to Proxy: {e}")
         return jsonify({"error": str(e)}), 500
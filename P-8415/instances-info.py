@@ -1,55 +1,97 @@
 import json
 import boto3
 import logging
+import os
+import secrets
 import time
-from constants import PROXY_USER, REPLICATION_USER, DB_DETAILS  # Import required constants
+from constants import PROXY_USER, REPLICATION_USER, DB_DETAILS, QUERY_TIMEOUTS  # Import required constants
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize AWS resources
-ec2 = boto3.resource('ec2')
+ec2_client = boto3.client('ec2')
 
 # Global variable to store instance details
 INSTANCE_DETAILS = {}
 
-import time
+ROLES = ['manager', 'worker', 'proxy', 'gatekeeper', 'trusted_host']
+PUBLIC_IP_TIMEOUT = 60  # seconds
+WAITER_DELAY = 5  # seconds
+INSTANCE_DETAILS_FILE = 'instance_details.json'
+
+def describe_running_instances(instance_ids=None):
+    """Return every running cluster instance with one paginated describe call."""
+    filters = [
+        {'Name': 'tag:Role', 'Values': ROLES},
+        {'Name': 'instance-state-name', 'Values': ['running']}
+    ]
+    kwargs = {'Filters': filters}
+    if instance_ids:
+        kwargs['InstanceIds'] = instance_ids
+    instances = []
+    for page in ec2_client.get_paginator('describe_instances').paginate(**kwargs):
+        for reservation in page['Reservations']:
+            instances.extend(reservation['Instances'])
+    return instances
+
+def wait_for_public_ips(instances, timeout=PUBLIC_IP_TIMEOUT):
+    """
+    Refresh instances lacking a public IP until they all have one or the timeout expires.
+
+    All pending instances are waited on and re-described together rather than one by one.
+    """
+    instances = {instance['InstanceId']: instance for instance in instances}
+    missing = [instance_id for instance_id, instance in instances.items() if not instance.get('PublicIpAddress')]
+    if missing:
+        logger.info(f"Waiting for public IP assignment for instances {missing}")
+        waiter = ec2_client.get_waiter('instance_running')
+        waiter.wait(
+            InstanceIds=missing,
+            WaiterConfig={'Delay': WAITER_DELAY, 'MaxAttempts': max(timeout // WAITER_DELAY, 1)}
+        )
+    elapsed = 0
+    while missing and elapsed < timeout:
+        for instance in describe_running_instances(missing):
+            instances[instance['InstanceId']] = instance
+        missing = [instance_id for instance_id in missing if not instances[instance_id].get('PublicIpAddress')]
+        if missing:
+            time.sleep(WAITER_DELAY)
+            elapsed += WAITER_DELAY
+    for instance_id in missing:
+        logger.error(f"No public IP assigned to instance {instance_id} after {timeout} seconds.")
+    return list(instances.values())
+
+def load_admin_token():
+    """
+    Return the token that authorizes admin commands at the Gatekeeper.
+
+    The token already in instance_details.json is kept, so services deployed with it
+    keep accepting it; a new one is generated only for a fresh cluster.
+    """
+    if os.path.isfile(INSTANCE_DETAILS_FILE):
+        with open(INSTANCE_DETAILS_FILE, 'r') as f:
+            token = json.load(f).get('admin_token')
+        if token:
+            return token
+    return secrets.token_urlsafe(32)
 
 def retrieve_instance_ips_by_role(save_to_file=True):
     """
     Retrieve instance public and private IPs by role, save to a JSON file.
     """
-    roles = ['manager', 'worker', 'proxy', 'gatekeeper', 'trusted_host']
-    instance_ips = {}
-    for role in roles:
-        instances = ec2.instances.filter(
-            Filters=[
-                {'Name': 'tag:Role', 'Values': [role]},
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
-        )
-        public_ips = []
-        private_ips = []
-        for instance in instances:
-            instance.load()
-            # Wait until public IP is assigned
-            timeout = 60  # seconds
-            interval = 5  # seconds
-            elapsed = 0
-            while instance.public_ip_address is None and elapsed < timeout:
-                logger.info(f"Waiting for public IP assignment for instance {instance.id}")
-                time.sleep(interval)
-                elapsed += interval
-                instance.reload()
-            if instance.public_ip_address is None:
-                logger.error(f"No public IP assigned to instance {instance.id} after {timeout} seconds.")
-            public_ips.append(instance.public_ip_address)
-            private_ips.append(instance.private_ip_address)
-        instance_ips[role] = {
-            'public_ips': public_ips,
-            'private_ips': private_ips
-        }
+    instances = wait_for_public_ips(describe_running_instances())
+
+    instance_ips = {role: {'public_ips': [], 'private_ips': []} for role in ROLES}
+    # Sort for a stable worker order between runs
+    for instance in sorted(instances, key=lambda instance: (instance['LaunchTime'], instance['InstanceId'])):
+        tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+        role = tags.get('Role')
+        if role not in instance_ips:
+            continue
+        instance_ips[role]['public_ips'].append(instance.get('PublicIpAddress'))
+        instance_ips[role]['private_ips'].append(instance.get('PrivateIpAddress'))
 
     # Add user credentials and DB details
     instance_ips['proxy_user'] = {
@@ -61,10 +103,12 @@ def retrieve_instance_ips_by_role(save_to_file=True):
         'password': REPLICATION_USER['password']
     }
     instance_ips['db_details'] = DB_DETAILS
+    instance_ips['query_timeouts'] = QUERY_TIMEOUTS
+    instance_ips['admin_token'] = load_admin_token()
 
     # Save to JSON file if required
     if save_to_file:
-        with open('instance_details.json', 'w') as f:
+        with open(INSTANCE_DETAILS_FILE, 'w') as f:
             json.dump(instance_ips, f, indent=4)
         logger.info("Instance details saved to 'instance_details.json'.")
 
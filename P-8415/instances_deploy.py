@@ -3,14 +3,14 @@ import logging
 import argparse
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize AWS resources
-ec2 = boto3.resource('ec2')
+# Initialize the AWS client
 ec2_client = boto3.client('ec2')
 
 # Constants
@@ -18,6 +18,8 @@ KEY_NAME = 'SQL'
 INSTANCE_TAG_PREFIX = 'MySQLCluster'
 KEY_FILE_PATH = f'{KEY_NAME}.pem'
 AMI_ID = 'ami-005fc0f236362e99f'  # Ubuntu 20.04 LTS in us-east-1
+WAITER_DELAY = 5  # Seconds between EC2 state polls while waiting for instances
+WAITER_MAX_ATTEMPTS = 60
 
 try:
     MY_PUBLIC_IP = f"{requests.get('https://checkip.amazonaws.com').text.strip()}/32"
@@ -84,18 +86,25 @@ def create_or_update_security_group(role, description):
             raise
 
 def apply_security_group_rules(sg_id, inbound_rules, security_groups):
-    """Apply inbound rules to an existing security group."""
-    ip_permissions = []
+    """Apply inbound rules to an existing security group, skipping rules it already has."""
     for port, source in inbound_rules:
-        ip_permissions.append({
+        permission = {
             'IpProtocol': 'tcp',
             'FromPort': port,
             'ToPort': port,
             'IpRanges': [{'CidrIp': source}] if '/' in source else [],
             'UserIdGroupPairs': [{'GroupId': security_groups[source]}] if source in security_groups else [],
-        })
+        }
+        # One rule per call, so a rule left by an earlier run does not block the rest
+        try:
+            ec2_client.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=[permission])
+        except ClientError as e:
+            if 'InvalidPermission.Duplicate' in str(e):
+                logger.info(f"Rule for port {port} from {source} already exists on {sg_id}")
+            else:
+                logger.error(f"Error adding rule for port {port} from {source} to {sg_id}: {e}")
+                raise
 
-    ec2_client.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=ip_permissions)
     logger.info(f"Ingress rules set for security group with ID: {sg_id}")
 
 def create_key_pair(key_name, key_file_path):
@@ -125,9 +134,16 @@ def get_default_subnet_id():
         logger.error("No default subnet found.")
         return None
 
-def launch_and_wait_instances(role, count, instance_type, sg_id, subnet_id):
+def get_security_group_ids(roles):
+    """Look up the IDs of existing security groups by name."""
+    response = ec2_client.describe_security_groups(GroupNames=list(roles))
+    return {group['GroupName']: group['GroupId'] for group in response['SecurityGroups']}
+
+def launch_instances(role, count, instance_type, sg_id, subnet_id):
+    """Request instances for a role and return their IDs without waiting for them."""
     try:
-        instances = ec2.create_instances(
+        # Clients are thread-safe, unlike resources, so roles can be launched from worker threads
+        response = ec2_client.run_instances(
             ImageId=AMI_ID,
             MinCount=count,
             MaxCount=count,
@@ -147,29 +163,80 @@ def launch_and_wait_instances(role, count, instance_type, sg_id, subnet_id):
                 ]
             }]
         )
-        instance_ids = [instance.id for instance in instances]
+        instance_ids = [instance['InstanceId'] for instance in response['Instances']]
         logger.info(f"Created instances for role {role}: {instance_ids}")
-
-        for instance_id in instance_ids:
-            instance = ec2.Instance(instance_id)
-            logger.info(f"Waiting for instance {instance_id} to enter 'running' state...")
-            instance.wait_until_running()
-            logger.info(f"Instance {instance_id} is now running.")
-
         return instance_ids
     except Exception as e:
-        logger.error(f"Failed to create and wait for instances for {role}: {e}")
+        logger.error(f"Failed to create instances for {role}: {e}")
         raise
 
+def wait_for_instances(instance_ids):
+    """Wait for all given instances to reach 'running' with a single collective waiter."""
+    logger.info(f"Waiting for {len(instance_ids)} instances to enter 'running' state...")
+    waiter = ec2_client.get_waiter('instance_running')
+    waiter.wait(
+        InstanceIds=instance_ids,
+        WaiterConfig={'Delay': WAITER_DELAY, 'MaxAttempts': WAITER_MAX_ATTEMPTS}
+    )
+    logger.info(f"Instances {instance_ids} are now running.")
+
+def get_existing_instances(roles):
+    """Return a dict of role to the IDs of its pending or running instances, found by 'Role' tag."""
+    existing = {role: [] for role in roles}
+    paginator = ec2_client.get_paginator('describe_instances')
+    pages = paginator.paginate(Filters=[
+        {'Name': 'tag:Role', 'Values': list(roles)},
+        {'Name': 'instance-state-name', 'Values': ['pending', 'running']},
+    ])
+    for page in pages:
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                role = next(tag['Value'] for tag in instance['Tags'] if tag['Key'] == 'Role')
+                existing[role].append(instance['InstanceId'])
+    return existing
+
+def launch_and_wait_instances(role_specs, subnet_id):
+    """
+    Launch every role concurrently, then wait for all of them together.
+
+    Instances left by an earlier, partly failed run are kept and only the missing
+    ones are launched, so rerunning the step does not duplicate any role.
+
+    :param role_specs: Dict of role to (count, instance_type, sg_id).
+    :return: Dict of role to its instance IDs.
+    """
+    instances_by_role = get_existing_instances(role_specs)
+    missing = {
+        role: (count - len(instances_by_role[role]), instance_type, sg_id)
+        for role, (count, instance_type, sg_id) in role_specs.items()
+        if len(instances_by_role[role]) < count
+    }
+    for role, ids in instances_by_role.items():
+        if ids:
+            logger.info(f"Reusing existing instances for role {role}: {ids}")
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = {
+                role: executor.submit(launch_instances, role, count, instance_type, sg_id, subnet_id)
+                for role, (count, instance_type, sg_id) in missing.items()
+            }
+            for role, future in futures.items():
+                instances_by_role[role] += future.result()
+
+    wait_for_instances([instance_id for ids in instances_by_role.values() for instance_id in ids])
+    return instances_by_role
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='AWS EC2 Deployment Script')
     parser.add_argument('--create-instances', action='store_true', help='Create new instances')
     parser.add_argument('--setup-aws-resources', action='store_true', help='Setup AWS resources (key pair, security groups)')
+    parser.add_argument('--worker-count', type=int, default=2, help='Number of worker instances to create')
     args = parser.parse_args()
 
+    security_groups = {}
     if args.setup_aws_resources:
         create_key_pair(KEY_NAME, KEY_FILE_PATH)
-        security_groups = {}
 
         # Step 1: Create all security groups
         for role, config in SECURITY_GROUP_CONFIGS.items():
@@ -187,10 +254,15 @@ if __name__ == "__main__":
             logger.error("Cannot proceed without a default subnet.")
             exit(1)
 
-        for role, config in SECURITY_GROUP_CONFIGS.items():
-            sg_id = security_groups[role]
-            count = 1 if role != "worker" else 2
+        # Reuse groups created by a previous --setup-aws-resources run
+        if not security_groups:
+            security_groups = get_security_group_ids(SECURITY_GROUP_CONFIGS)
+
+        role_specs = {}
+        for role in SECURITY_GROUP_CONFIGS:
+            count = 1 if role != "worker" else args.worker_count
             instance_type = "t2.large" if role in ["proxy", "gatekeeper", "trusted_host"] else "t2.micro"
-            launch_and_wait_instances(role, count, instance_type, sg_id, default_subnet_id)
+            role_specs[role] = (count, instance_type, security_groups[role])
+        launch_and_wait_instances(role_specs, default_subnet_id)
 
     logger.info("Deployment completed.")
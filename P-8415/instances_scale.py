@@ -0,0 +1,149 @@
+import argparse
+import importlib.util
+import json
+import logging
+import time
+
+# instances_setup configures logging first, so its per-task format is the one in effect
+import instances_setup
+from instances_setup import (
+    INSTANCE_DETAILS_FILE,
+    ROOT_PASSWORD,
+    bootstrap_worker_from_snapshot,
+    close_ssh_sessions,
+    execute_command,
+    get_ssh_session,
+    push_instance_details,
+    setup_database,
+)
+from instances_deploy import (
+    ec2_client,
+    get_default_subnet_id,
+    get_security_group_ids,
+    launch_instances,
+    wait_for_instances,
+)
+
+logger = logging.getLogger(__name__)
+
+# instances-info.py has a hyphenated name, so it is loaded by path
+_spec = importlib.util.spec_from_file_location('instances_info', 'instances-info.py')
+instances_info = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(instances_info)
+
+WORKER_INSTANCE_TYPE = 't2.micro'
+SSH_READY_TIMEOUT = 180  # seconds for sshd to come up on a fresh instance
+CATCH_UP_TIMEOUT = 600  # seconds for a new worker to reach the manager before it is registered
+POLL_INTERVAL = 5  # seconds
+DEFAULT_DRAIN_SECONDS = 30  # time for in-flight queries to finish on a removed worker
+
+def save_instance_details(details):
+    """Write instance details to disk and make instances_setup use them."""
+    with open(INSTANCE_DETAILS_FILE, 'w') as f:
+        json.dump(details, f, indent=4)
+    instances_setup.INSTANCE_DETAILS = details
+    logger.info(f"Instance details saved to '{INSTANCE_DETAILS_FILE}'.")
+
+def wait_for_ssh(ip_address, timeout=SSH_READY_TIMEOUT):
+    """Retry the SSH connection until sshd on a new instance accepts it."""
+    elapsed = 0
+    while True:
+        try:
+            return get_ssh_session(ip_address)
+        except Exception as e:
+            if elapsed >= timeout:
+                raise
+            logger.info(f"SSH on {ip_address} not ready yet ({e}); retrying")
+            time.sleep(POLL_INTERVAL)
+            elapsed += POLL_INTERVAL
+
+def wait_for_replica_catch_up(ip_address, timeout=CATCH_UP_TIMEOUT):
+    """Block until the worker's SQL thread runs with no lag behind the manager."""
+    ssh = get_ssh_session(ip_address)
+    elapsed = 0
+    while elapsed < timeout:
+        _, output, _ = execute_command(ssh, f"mysql -u root -p'{ROOT_PASSWORD}' -e 'SHOW SLAVE STATUS\\G'")
+        status = {}
+        for line in output.strip().split('\n'):
+            if ':' in line:
+                key, value = line.strip().split(':', 1)
+                status[key.strip()] = value.strip()
+        if status.get('Slave_SQL_Running') == 'Yes' and status.get('Seconds_Behind_Master') == '0':
+            logger.info(f"Worker {ip_address} has caught up with the manager")
+            return
+        time.sleep(POLL_INTERVAL)
+        elapsed += POLL_INTERVAL
+    raise TimeoutError(f"Worker {ip_address} did not catch up within {timeout} seconds")
+
+def add_worker():
+    """Launch a worker, bootstrap it from a manager snapshot and register it with the proxy."""
+    subnet_id = get_default_subnet_id()
+    if not subnet_id:
+        raise RuntimeError("Cannot launch a worker without a default subnet.")
+    sg_id = get_security_group_ids(['worker'])['worker']
+    instance_ids = launch_instances('worker', 1, WORKER_INSTANCE_TYPE, sg_id, subnet_id)
+    wait_for_instances(instance_ids)
+    instance = instances_info.wait_for_public_ips(instances_info.describe_running_instances(instance_ids))[0]
+    public_ip, private_ip = instance['PublicIpAddress'], instance['PrivateIpAddress']
+
+    wait_for_ssh(public_ip)
+    setup_database(public_ip, sakila_mode='skip')
+    bootstrap_worker_from_snapshot(public_ip)
+    wait_for_replica_catch_up(public_ip)
+
+    # Only send reads to the worker once it holds current data
+    details = instances_setup.INSTANCE_DETAILS
+    details['worker']['public_ips'].append(public_ip)
+    details['worker']['private_ips'].append(private_ip)
+    save_instance_details(details)
+    push_instance_details('proxy')
+    logger.info(f"Worker {public_ip} ({private_ip}) added to the cluster.")
+
+def remove_worker(ip_address, drain_seconds=DEFAULT_DRAIN_SECONDS):
+    """Stop routing to a worker, let in-flight queries finish, then terminate it."""
+    details = instances_setup.INSTANCE_DETAILS
+    workers = details['worker']
+    if ip_address in workers['public_ips']:
+        index = workers['public_ips'].index(ip_address)
+    elif ip_address in workers['private_ips']:
+        index = workers['private_ips'].index(ip_address)
+    else:
+        raise ValueError(f"{ip_address} is not a registered worker")
+    public_ip = workers['public_ips'].pop(index)
+    private_ip = workers['private_ips'].pop(index)
+    save_instance_details(details)
+    push_instance_details('proxy')
+
+    logger.info(f"Draining worker {public_ip} for {drain_seconds} seconds")
+    time.sleep(drain_seconds)
+
+    response = ec2_client.describe_instances(
+        Filters=[{'Name': 'private-ip-address', 'Values': [private_ip]}]
+    )
+    instance_ids = [
+        instance['InstanceId']
+        for reservation in response['Reservations']
+        for instance in reservation['Instances']
+    ]
+    if instance_ids:
+        ec2_client.terminate_instances(InstanceIds=instance_ids)
+        logger.info(f"Terminated worker instances {instance_ids}")
+    else:
+        logger.warning(f"No instance found for worker {private_ip}; nothing to terminate")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add or remove read workers on a running cluster')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('add-worker', help='Launch, bootstrap and register a new worker')
+    remove_parser = subparsers.add_parser('remove-worker', help='Drain and terminate a worker')
+    remove_parser.add_argument('ip', help='Public or private IP of the worker to remove')
+    remove_parser.add_argument('--drain-seconds', type=int, default=DEFAULT_DRAIN_SECONDS, help='Wait for in-flight queries before terminating')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'add-worker':
+            add_worker()
+        else:
+            remove_worker(args.ip, args.drain_seconds)
+    finally:
+        close_ssh_sessions()
@@ -1,17 +1,76 @@
 import json
 import paramiko
 import logging
+import argparse
+import hashlib
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; the thread name carries the setup task, so interleaved lines stay attributable
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(threadName)s:%(message)s')
 logger = logging.getLogger(__name__)
 
 # Constants
 KEY_NAME = 'SQL'  # My AWS key pair name
 KEY_FILE_PATH = f'{KEY_NAME}.pem'
 SSH_USERNAME = 'ubuntu'  # Default username for Ubuntu instances
+ROOT_PASSWORD = 'root'
+MAX_PARALLEL_HOSTS = 8  # Upper bound on hosts provisioned at the same time
+# "snapshot" streams workers' data from the manager; "import" loads Sakila on every worker
+BOOTSTRAP_MODES = ['snapshot', 'import']
+# Host groups that can be provisioned by separate runs of this script
+SETUP_SCOPES = ['all', 'database', 'application']
+SSH_KEEPALIVE_INTERVAL = 30  # seconds
+SSH_CONNECT_TIMEOUT = 20  # seconds to reach a host and finish the SSH handshake
+SERVICE_PORT = 5000  # Port every application tier listens on
+SERVICE_START_TIMEOUT = 30  # seconds a restarted service has to start answering
+
+# Paths to local scripts
+SETUP_DBS_SCRIPT = 'setup_dbs.sh'
+SETUP_REPLICATION_SCRIPT = 'setup_replication.sh'
+INSTANCE_DETAILS_FILE = 'instance_details.json'
+# Local modules imported by every application tier, uploaded next to its script
+SHARED_MODULES = ['compression.py', 'tracing.py']
+
+# Application tiers: script to deploy, name on the host and commands to prepare the host
+APP_SERVICES = {
+    'proxy': {
+        'script': 'i-proxy.py',
+        'remote_name': 'proxy.py',
+        'commands': [
+            'sudo apt-get update',
+            'sudo apt-get install -y python3-pip',
+            'pip3 install flask pymysql boto3 sqlparse ping3 requests cachetools zstandard lz4',
+            'sudo ufw allow 5000/tcp'  # Open port 5000 for Flask
+        ],
+        # Exits 0 when the commands above have already been satisfied
+        'installed_check': "python3 -c 'import flask, pymysql, boto3, sqlparse, ping3, requests, cachetools, zstandard, lz4'",
+        # Picks up instance_details.json changes through /reload instead of a restart
+        'reload_command': 'curl -sf -X POST http://localhost:5000/reload',
+    },
+    'gatekeeper': {
+        'script': 'i-gatekeeper.py',
+        'remote_name': 'gatekeeper.py',
+        'commands': [
+            'sudo apt-get update',
+            'sudo apt-get install -y python3-pip',
+            'pip3 install flask requests zstandard lz4'
+        ],
+        'installed_check': "python3 -c 'import flask, requests, zstandard, lz4'",
+    },
+    'trusted_host': {
+        'script': 'i-trusted-host.py',
+        'remote_name': 'trusted_host.py',
+        'commands': [
+            'sudo apt-get update',
+            'sudo apt-get install -y python3-pip ufw',
+            'pip3 install flask requests zstandard lz4'
+        ],
+        'installed_check': "python3 -c 'import flask, requests, zstandard, lz4' && command -v ufw",
+    },
+}
 
 # Load instance details from JSON
 with open('instance_details.json', 'r') as f:
@@ -22,9 +81,43 @@ def ssh_connect(ip_address):
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     logger.info(f"Connecting to {ip_address} as {SSH_USERNAME}")
-    ssh.connect(ip_address, username=SSH_USERNAME, key_filename=KEY_FILE_PATH)
+    ssh.connect(
+        ip_address,
+        username=SSH_USERNAME,
+        key_filename=KEY_FILE_PATH,
+        timeout=SSH_CONNECT_TIMEOUT,
+        banner_timeout=SSH_CONNECT_TIMEOUT,
+        auth_timeout=SSH_CONNECT_TIMEOUT,
+    )
     return ssh
 
+# One SSH connection per host for the whole run; commands and transfers are multiplexed over it
+SSH_SESSIONS = {}
+SSH_SESSIONS_LOCK = threading.Lock()  # Guards the dicts only, never held while connecting
+SSH_HOST_LOCKS = {}  # One lock per host, so a slow host only delays its own tasks
+
+def get_ssh_session(ip_address):
+    """Return the shared SSH session for a host, reconnecting if it was dropped."""
+    with SSH_SESSIONS_LOCK:
+        host_lock = SSH_HOST_LOCKS.setdefault(ip_address, threading.Lock())
+    with host_lock:
+        with SSH_SESSIONS_LOCK:
+            ssh = SSH_SESSIONS.get(ip_address)
+        transport = ssh.get_transport() if ssh else None
+        if transport is None or not transport.is_active():
+            ssh = ssh_connect(ip_address)
+            ssh.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+            with SSH_SESSIONS_LOCK:
+                SSH_SESSIONS[ip_address] = ssh
+        return ssh
+
+def close_ssh_sessions():
+    """Close every shared SSH session."""
+    with SSH_SESSIONS_LOCK:
+        for ssh in SSH_SESSIONS.values():
+            ssh.close()
+        SSH_SESSIONS.clear()
+
 # Function to transfer a file to the instance
 def transfer_file(ssh, local_path, remote_path):
     if not os.path.isfile(local_path):
@@ -37,7 +130,7 @@ def transfer_file(ssh, local_path, remote_path):
     logger.info(f"Transferred {local_path} to {remote_path}")
 
 # Function to execute a command on the instance
-def execute_command(ssh, command):
+def execute_command(ssh, command, check=False):
     logger.info(f"Executing command: {command}")
     stdin, stdout, stderr = ssh.exec_command(command)
     exit_status = stdout.channel.recv_exit_status()  # Wait for command to complete
@@ -49,200 +142,298 @@ def execute_command(ssh, command):
             logger.warning(f"Command generated warnings:\n{error}")
     else:
         logger.error(f"Command failed with exit status {exit_status}. Error:\n{error}")
+        if check:
+            raise RuntimeError(f"Command failed with exit status {exit_status}: {command}")
     return exit_status, output, error
 
-# Main function to set up instances
-def main():
-    replication_user = INSTANCE_DETAILS['replication_user']['name']
-    replication_password = INSTANCE_DETAILS['replication_user']['password']
-    proxy_user = INSTANCE_DETAILS['proxy_user']['name']
-    proxy_password = INSTANCE_DETAILS['proxy_user']['password']
-    db_name = INSTANCE_DETAILS['db_details']['db_name']
-    root_password = 'root' 
-
-    # Paths to local scripts
-    setup_dbs_script = 'setup_dbs.sh'
-    setup_replication_script = 'setup_replication.sh'
-    proxy_script = 'i-proxy.py'
-    gatekeeper_script = 'i-gatekeeper.py'
-    trusted_host_script = 'i-trusted-host.py'
-    instance_details_file = 'instance_details.json'
-
-    # Check that all required files are present
-    required_files = [
-        setup_dbs_script,
-        setup_replication_script,
-        proxy_script,
-        gatekeeper_script,
-        trusted_host_script,
-        instance_details_file
-    ]
-    for file in required_files:
-        if not os.path.isfile(file):
-            logger.error(f"Required file '{file}' not found in the current directory.")
-            return
-
-    # Set up the manager instance
-    manager_ip = INSTANCE_DETAILS['manager']['public_ips'][0]
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a local file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remote_sha256(ssh, remote_paths):
+    """Return {remote_path: digest} for the remote files that exist."""
+    _, stdout, _ = ssh.exec_command(f"sha256sum {' '.join(remote_paths)} 2>/dev/null")
+    digests = {}
+    for line in stdout.read().decode().splitlines():
+        digest, _, path = line.partition('  ')
+        digests[path.strip()] = digest
+    return digests
+
+def sync_files(ssh, files):
+    """
+    Upload only the files whose content differs from the copy on the host.
+
+    :param files: List of (local_path, remote_path) tuples.
+    :return: Set of remote paths that were uploaded.
+    """
+    remote_digests = remote_sha256(ssh, [remote_path for _, remote_path in files])
+    changed = set()
+    for local_path, remote_path in files:
+        if remote_digests.get(remote_path) == file_sha256(local_path):
+            logger.info(f"{remote_path} is up to date")
+            continue
+        transfer_file(ssh, local_path, remote_path)
+        changed.add(remote_path)
+    return changed
+
+def service_pattern(remote_path):
+    """pgrep/pkill pattern for a service that does not match the shell running the command."""
+    return f"'python3 [{remote_path[0]}]{remote_path[1:]}'"
+
+def restart_service(ssh, remote_path):
+    """
+    Stop any running copy of a Python service, start it again in the background and
+    wait until it answers on SERVICE_PORT.
+
+    :raises RuntimeError: If the service exits or does not answer within SERVICE_START_TIMEOUT.
+    """
+    log_name = os.path.basename(remote_path).replace('.py', '.log')
+    execute_command(ssh, f'pkill -f {service_pattern(remote_path)}; sleep 1; nohup python3 {remote_path} &> {log_name} &')
+    # Any HTTP answer, even a 404, means the server is listening; stop early if the process died
+    wait_command = (
+        f"for i in $(seq {SERVICE_START_TIMEOUT}); do "
+        f"curl -s -o /dev/null http://localhost:{SERVICE_PORT}/ && exit 0; "
+        f"pgrep -f {service_pattern(remote_path)} > /dev/null || exit 1; "
+        f"sleep 1; done; exit 1"
+    )
+    if execute_command(ssh, wait_command)[0] != 0:
+        _, log_tail, _ = execute_command(ssh, f'tail -n 20 {log_name}')
+        raise RuntimeError(f"{remote_path} did not start answering on port {SERVICE_PORT}:\n{log_tail}")
+    logger.info(f"{remote_path} is running")
+
+def reload_service(ssh, role):
+    """Ask a running service to re-read instance_details.json in place."""
+    execute_command(ssh, APP_SERVICES[role]['reload_command'], check=True)
+
+def push_instance_details(role):
+    """Upload the current instance_details.json to an application tier and apply it."""
+    ssh = get_ssh_session(INSTANCE_DETAILS[role]['public_ips'][0])
+    transfer_file(ssh, INSTANCE_DETAILS_FILE, '/home/ubuntu/instance_details.json')
+    if APP_SERVICES[role].get('reload_command'):
+        reload_service(ssh, role)
+    else:
+        restart_service(ssh, f"/home/ubuntu/{APP_SERVICES[role]['remote_name']}")
+
+def setup_database(ip_address, sakila_mode='import'):
+    """Install MySQL on a manager or worker instance, loading Sakila unless sakila_mode is 'skip'."""
+    ssh = get_ssh_session(ip_address)
+    transfer_file(ssh, INSTANCE_DETAILS_FILE, '/home/ubuntu/instance_details.json')
+    transfer_file(ssh, SETUP_DBS_SCRIPT, '/home/ubuntu/setup_dbs.sh')
+    execute_command(ssh, f'sudo bash /home/ubuntu/setup_dbs.sh {ROOT_PASSWORD} {sakila_mode}', check=True)
+
+def configure_manager(ip_address):
+    """
+    Enable binlog replication on the manager and return its master status.
+
+    :return: Dict with the manager's 'File' and 'Position'.
+    """
+    replication_user = INSTANCE_DETAILS['replication_user']
+    proxy_user = INSTANCE_DETAILS['proxy_user']
+    ssh = get_ssh_session(ip_address)
+    transfer_file(ssh, SETUP_REPLICATION_SCRIPT, '/home/ubuntu/setup_replication.sh')
+    command = f'sudo bash /home/ubuntu/setup_replication.sh manager \"\" \"\" \"\" {ROOT_PASSWORD} {replication_user["name"]} {replication_user["password"]} {proxy_user["name"]} {proxy_user["password"]}'
+    execute_command(ssh, command, check=True)
+
+    # Retrieve MASTER_LOG_FILE and MASTER_LOG_POS
+    # Wait a bit to ensure MySQL is fully up
+    time.sleep(5)
+    command = f"mysql -u root -p'{ROOT_PASSWORD}' -e 'SHOW MASTER STATUS\\G'"
+    exit_status, output, error = execute_command(ssh, command, check=True)
+    logger.info("Retrieved master status from manager")
+    # Parse output to get File and Position
+    master_status = {}
+    for line in output.strip().split('\n'):
+        if ':' in line:
+            key, value = line.strip().split(':', 1)
+            master_status[key.strip()] = value.strip()
+    if not master_status.get('File') or not master_status.get('Position'):
+        raise RuntimeError(f"Could not parse master status from manager output:\n{output}")
+    return master_status
+
+def configure_worker(ip_address, master_status):
+    """Attach a worker to the manager at the given binlog coordinates."""
+    replication_user = INSTANCE_DETAILS['replication_user']
+    proxy_user = INSTANCE_DETAILS['proxy_user']
     manager_private_ip = INSTANCE_DETAILS['manager']['private_ips'][0]
-    logger.info(f"Setting up manager at IP {manager_ip}")
-    ssh_manager = ssh_connect(manager_ip)
-
-    try:
-        # Transfer instance_details.json to manager
-        transfer_file(ssh_manager, instance_details_file, '/home/ubuntu/instance_details.json')
-
-        # Transfer and execute setup_dbs.sh on manager
-        transfer_file(ssh_manager, setup_dbs_script, '/home/ubuntu/setup_dbs.sh')
-        command = f'sudo bash /home/ubuntu/setup_dbs.sh {root_password}'
-        execute_command(ssh_manager, command)
-
-        # Transfer and execute setup_replication.sh on manager
-        transfer_file(ssh_manager, setup_replication_script, '/home/ubuntu/setup_replication.sh')
-        command = f'sudo bash /home/ubuntu/setup_replication.sh manager \"\" \"\" \"\" {root_password} {replication_user} {replication_password} {proxy_user} {proxy_password}'
-        execute_command(ssh_manager, command)
-
-        # Retrieve MASTER_LOG_FILE and MASTER_LOG_POS
-        # Wait a bit to ensure MySQL is fully up
-        time.sleep(5)
-        command = f"mysql -u root -p'{root_password}' -e 'SHOW MASTER STATUS\\G'"
-        exit_status, output, error = execute_command(ssh_manager, command)
-        if exit_status != 0:
-            logger.error(f"Error retrieving master status from manager. Exit status {exit_status}. Error:\n{error}")
-            ssh_manager.close()
+    ssh = get_ssh_session(ip_address)
+    transfer_file(ssh, SETUP_REPLICATION_SCRIPT, '/home/ubuntu/setup_replication.sh')
+    command = f'sudo bash /home/ubuntu/setup_replication.sh worker {manager_private_ip} {master_status["File"]} {master_status["Position"]} {ROOT_PASSWORD} {replication_user["name"]} {replication_user["password"]} {proxy_user["name"]} {proxy_user["password"]}'
+    execute_command(ssh, command, check=True)
+
+def bootstrap_worker_from_snapshot(ip_address):
+    """Stream a consistent snapshot of the manager into a worker and replicate from its GTID set."""
+    replication_user = INSTANCE_DETAILS['replication_user']
+    proxy_user = INSTANCE_DETAILS['proxy_user']
+    manager_private_ip = INSTANCE_DETAILS['manager']['private_ips'][0]
+    ssh = get_ssh_session(ip_address)
+    transfer_file(ssh, SETUP_REPLICATION_SCRIPT, '/home/ubuntu/setup_replication.sh')
+    command = f'sudo bash /home/ubuntu/setup_replication.sh worker_snapshot {manager_private_ip} \"\" \"\" {ROOT_PASSWORD} {replication_user["name"]} {replication_user["password"]} {proxy_user["name"]} {proxy_user["password"]}'
+    execute_command(ssh, command, check=True)
+
+def setup_app_host(role, redeploy=False):
+    """
+    Install dependencies, deploy and start the Flask service for an application tier.
+
+    In redeploy mode, install steps already satisfied on the host are skipped and the
+    service is only restarted when its script or configuration changed.
+    """
+    service = APP_SERVICES[role]
+    ip_address = INSTANCE_DETAILS[role]['public_ips'][0]
+    remote_path = f"/home/ubuntu/{service['remote_name']}"
+    ssh = get_ssh_session(ip_address)
+
+    if redeploy and execute_command(ssh, service['installed_check'])[0] == 0:
+        logger.info(f"Packages already installed on {role}")
+    else:
+        logger.info(f"Installing necessary packages on {role}")
+        for cmd in service['commands']:
+            execute_command(ssh, cmd, check=True)
+
+    files = [(INSTANCE_DETAILS_FILE, '/home/ubuntu/instance_details.json'), (service['script'], remote_path)]
+    files += [(module, f'/home/ubuntu/{module}') for module in SHARED_MODULES]
+    if redeploy:
+        changed = sync_files(ssh, files)
+        running = execute_command(ssh, f'pgrep -f {service_pattern(remote_path)}')[0] == 0
+        if running and not changed:
+            logger.info(f"{role} is up to date; not restarting")
             return
-        else:
-            logger.info("Retrieved master status from manager")
-            # Parse output to get File and Position
-            lines = output.strip().split('\n')
-            master_status = {}
-            for line in lines:
-                if ':' in line:
-                    key, value = line.strip().split(':', 1)
-                    master_status[key.strip()] = value.strip()
-            master_log_file = master_status.get('File')
-            master_log_pos = master_status.get('Position')
-
-    finally:
-        ssh_manager.close()
-
-    # Set up worker instances
-    worker_ips = INSTANCE_DETAILS['worker']['public_ips']
-    worker_private_ips = INSTANCE_DETAILS['worker']['private_ips']
-    for i, worker_ip in enumerate(worker_ips):
-        worker_private_ip = worker_private_ips[i]
-        logger.info(f"Setting up worker at IP {worker_ip}")
-        ssh_worker = ssh_connect(worker_ip)
-
-        try:
-            # Transfer instance_details.json to worker
-            transfer_file(ssh_worker, instance_details_file, '/home/ubuntu/instance_details.json')
-
-            # Transfer and execute setup_dbs.sh on worker
-            transfer_file(ssh_worker, setup_dbs_script, '/home/ubuntu/setup_dbs.sh')
-            command = f'sudo bash /home/ubuntu/setup_dbs.sh {root_password}'
-            execute_command(ssh_worker, command)
-
-            # Transfer and execute setup_replication.sh on worker
-            transfer_file(ssh_worker, setup_replication_script, '/home/ubuntu/setup_replication.sh')
-            command = f'sudo bash /home/ubuntu/setup_replication.sh worker {manager_private_ip} {master_log_file} {master_log_pos} {root_password} {replication_user} {replication_password} {proxy_user} {proxy_password}'
-            execute_command(ssh_worker, command)
-
-        finally:
-            ssh_worker.close()
-
-    # Set up the proxy instance
-    proxy_ip = INSTANCE_DETAILS['proxy']['public_ips'][0]
-    logger.info(f"Setting up proxy at IP {proxy_ip}")
-    ssh_proxy = ssh_connect(proxy_ip)
-
-    try:
-        # Transfer instance_details.json to proxy
-        transfer_file(ssh_proxy, instance_details_file, '/home/ubuntu/instance_details.json')
-
-        # Install necessary packages on proxy
-        logger.info("Installing necessary packages on proxy")
-        commands = [
-            'sudo apt-get update',
-            'sudo apt-get install -y python3-pip',
-            'pip3 install flask pymysql boto3 sqlparse ping3 requests cachetools',
-            'sudo ufw allow 5000/tcp'  # Open port 5000 for Flask
-        ]
-        for cmd in commands:
-            execute_command(ssh_proxy, cmd)
-
-        # Transfer proxy.py to proxy
-        transfer_file(ssh_proxy, proxy_script, '/home/ubuntu/proxy.py')
-
-        # Start proxy.py
-        logger.info("Starting proxy server")
-        command = 'nohup python3 /home/ubuntu/proxy.py &> proxy.log &'
-        execute_command(ssh_proxy, command)
-
-    finally:
-        ssh_proxy.close()
-
-    # Set up the Gatekeeper instance
-    gatekeeper_ip = INSTANCE_DETAILS['gatekeeper']['public_ips'][0]
-    logger.info(f"Setting up Gatekeeper at IP {gatekeeper_ip}")
-    ssh_gatekeeper = ssh_connect(gatekeeper_ip)
-
-    try:
-        # Transfer instance_details.json to Gatekeeper
-        transfer_file(ssh_gatekeeper, instance_details_file, '/home/ubuntu/instance_details.json')
-
-        # Install necessary packages on Gatekeeper
-        logger.info("Installing necessary packages on Gatekeeper")
-        commands = [
-            'sudo apt-get update',
-            'sudo apt-get install -y python3-pip',
-            'pip3 install flask requests'
-        ]
-        for cmd in commands:
-            execute_command(ssh_gatekeeper, cmd)
+        if running and changed == {'/home/ubuntu/instance_details.json'} and service.get('reload_command'):
+            logger.info(f"Reloading {role} configuration without a restart")
+            reload_service(ssh, role)
+            return
+    else:
+        for local_path, remote_file in files:
+            transfer_file(ssh, local_path, remote_file)
+
+    logger.info(f"Starting {role} server")
+    restart_service(ssh, remote_path)
+
+def build_redeploy_tasks():
+    """Tasks that push changed application code and configuration; databases are left alone."""
+    return {
+        role: {'deps': [], 'run': lambda results, role=role: setup_app_host(role, redeploy=True)}
+        for role in APP_SERVICES
+    }
+
+def build_setup_tasks(bootstrap='snapshot', scope='all'):
+    """
+    Describe provisioning as a dependency graph.
+
+    Each task maps to {'deps': [task names], 'run': callable(results)}, where results
+    holds the return values of the finished dependencies. Only worker replication
+    depends on anything: it needs a configured manager and its own MySQL.
+    """
+    tasks = {}
+    if scope in ('all', 'application'):
+        for role in APP_SERVICES:
+            tasks[role] = {'deps': [], 'run': lambda results, role=role: setup_app_host(role)}
+    if scope == 'application':
+        return tasks
 
-        # Transfer gatekeeper.py to Gatekeeper
-        transfer_file(ssh_gatekeeper, gatekeeper_script, '/home/ubuntu/gatekeeper.py')
+    manager_ip = INSTANCE_DETAILS['manager']['public_ips'][0]
 
-        # Start gatekeeper.py
-        logger.info("Starting Gatekeeper server")
-        command = 'nohup python3 /home/ubuntu/gatekeeper.py &> gatekeeper.log &'
-        execute_command(ssh_gatekeeper, command)
+    def run_manager(results):
+        setup_database(manager_ip)
+        return configure_manager(manager_ip)
 
-    finally:
-        ssh_gatekeeper.close()
+    tasks['manager'] = {'deps': [], 'run': run_manager}
+    for i, worker_ip in enumerate(INSTANCE_DETAILS['worker']['public_ips'], start=1):
+        database_task = f'worker-{i}:database'
+        if bootstrap == 'snapshot':
+            setup = lambda results, ip=worker_ip: setup_database(ip, sakila_mode='skip')
+            replicate = lambda results, ip=worker_ip: bootstrap_worker_from_snapshot(ip)
+        else:
+            setup = lambda results, ip=worker_ip: setup_database(ip)
+            replicate = lambda results, ip=worker_ip: configure_worker(ip, results['manager'])
+        tasks[database_task] = {'deps': [], 'run': setup}
+        tasks[f'worker-{i}:replication'] = {'deps': ['manager', database_task], 'run': replicate}
+    return tasks
+
+def run_task(name, task, results):
+    """Run one setup task in a worker thread named after it."""
+    threading.current_thread().name = name
+    start = time.time()
+    logger.info(f"Starting {name}")
+    result = task['run'](results)
+    logger.info(f"Finished {name} in {time.time() - start:.1f} seconds")
+    return result
+
+def run_task_graph(tasks, max_parallel=MAX_PARALLEL_HOSTS):
+    """
+    Run tasks concurrently as soon as their dependencies have succeeded.
+
+    A failed task only takes down the tasks that depend on it.
+
+    :return: Tuple of (results by task name, set of failed or skipped task names).
+    """
+    results = {}
+    failed = set()
+    pending = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for name, task in list(pending.items()):
+                if any(dep in failed for dep in task['deps']):
+                    logger.error(f"Skipping {name}: a dependency failed")
+                    failed.add(name)
+                    del pending[name]
+                elif all(dep in results for dep in task['deps']):
+                    running[executor.submit(run_task, name, task, results)] = name
+                    del pending[name]
+            if not running:
+                # Skipped tasks can unblock further skips; anything else left is unsatisfiable
+                if any(dep in failed for task in pending.values() for dep in task['deps']):
+                    continue
+                for name in pending:
+                    logger.error(f"Skipping {name}: unresolvable dependencies {tasks[name]['deps']}")
+                failed.update(pending)
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Task {name} failed: {e}")
+                    failed.add(name)
+            logger.info(f"Progress: {len(results)} done, {len(failed)} failed, "
+                        f"{len(running)} running, {len(pending)} waiting")
+    return results, failed
 
-    # Set up the Trusted Host instance
-    trusted_host_ip = INSTANCE_DETAILS['trusted_host']['public_ips'][0]
-    trusted_host_private_ip = INSTANCE_DETAILS['trusted_host']['private_ips'][0]
-    gatekeeper_private_ip = INSTANCE_DETAILS['gatekeeper']['private_ips'][0]
-    logger.info(f"Setting up Trusted Host at IP {trusted_host_ip}")
-    ssh_trusted_host = ssh_connect(trusted_host_ip)
+# Main function to set up instances
+def main(max_parallel=MAX_PARALLEL_HOSTS, redeploy=False, bootstrap='snapshot', scope='all'):
+    # Check that all required files are present
+    required_files = [SETUP_DBS_SCRIPT, SETUP_REPLICATION_SCRIPT, INSTANCE_DETAILS_FILE]
+    required_files += [service['script'] for service in APP_SERVICES.values()] + SHARED_MODULES
+    for file in required_files:
+        if not os.path.isfile(file):
+            logger.error(f"Required file '{file}' not found in the current directory.")
+            return False
 
+    start = time.time()
+    tasks = build_redeploy_tasks() if redeploy else build_setup_tasks(bootstrap, scope)
     try:
-        # Transfer instance_details.json to Trusted Host
-        transfer_file(ssh_trusted_host, instance_details_file, '/home/ubuntu/instance_details.json')
-
-        # Install necessary packages on Trusted Host
-        logger.info("Installing necessary packages on Trusted Host")
-        commands = [
-            'sudo apt-get update',
-            'sudo apt-get install -y python3-pip ufw',
-            'pip3 install flask requests'
-        ]
-        for cmd in commands:
-            execute_command(ssh_trusted_host, cmd)
-
-        # Transfer trusted_host.py to Trusted Host
-        transfer_file(ssh_trusted_host, trusted_host_script, '/home/ubuntu/trusted_host.py')
-
-        # Start trusted_host.py
-        logger.info("Starting Trusted Host server")
-        command = 'nohup python3 /home/ubuntu/trusted_host.py &> trusted_host.log &'
-        execute_command(ssh_trusted_host, command)
-
+        results, failed = run_task_graph(tasks, max_parallel)
     finally:
-        ssh_trusted_host.close()
+        close_ssh_sessions()
+    logger.info(f"Setup finished in {time.time() - start:.1f} seconds")
+    if failed:
+        logger.error(f"Setup failed for: {', '.join(sorted(failed))}")
+        return False
+    return True
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Provision the MySQL cluster and application tiers')
+    parser.add_argument('--max-parallel', type=int, default=MAX_PARALLEL_HOSTS, help='Maximum number of hosts set up concurrently')
+    parser.add_argument('--redeploy', action='store_true', help='Only push changed application files and restart affected services')
+    parser.add_argument('--bootstrap', choices=BOOTSTRAP_MODES, default='snapshot', help='How workers get their initial data')
+    parser.add_argument('--only', choices=SETUP_SCOPES, default='all', help='Provision only the database or the application hosts')
+    args = parser.parse_args()
+
+    if not main(args.max_parallel, args.redeploy, args.bootstrap, args.only):
+        exit(1)
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+# The proxy lives in a hyphenated file, so it has to be loaded by path
+PROXY_SCRIPT = "i-proxy.py"
+CONFIG_FILE_PATH = "instance_details.json"
+DEFAULT_ITERATIONS = 10000
+DEFAULT_REPEATS = 5
+REGRESSION_THRESHOLD = 0.10  # Flag anything more than 10% slower than the baseline
+
+# Representative traffic, matching what send.py pushes through the cluster
+SAMPLE_QUERIES = {
+    "select": "SELECT * FROM actor WHERE actor_id = 2001;",
+    "insert": """
+        INSERT INTO actor (actor_id, first_name, last_name) VALUES
+        (2001, 'FirstName1', 'LastName1')
+        ON DUPLICATE KEY UPDATE first_name = 'FirstName1', last_name = 'LastName1';
+        """,
+    "update": "UPDATE actor SET last_name = 'LastName1' WHERE actor_id = 2001;",
+    "other": "SHOW TABLES;",
+}
+
+def load_proxy():
+    """Import i-proxy.py as a module and point it at the local instance details."""
+    spec = importlib.util.spec_from_file_location("proxy", PROXY_SCRIPT)
+    proxy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(proxy)
+    with open(CONFIG_FILE_PATH, "r") as f:
+        proxy.INSTANCE_DETAILS = json.load(f)
+    # Routing ends in a MySQL connection; return the chosen config instead so no network is touched
+    proxy.connect_to_db = lambda config, **kwargs: config
+    return proxy
+
+def sample_rows(count):
+    """Build rows shaped like a DictCursor fetch from Sakila's actor table."""
+    last_update = datetime.datetime(2006, 2, 15, 4, 34, 33)
+    return [
+        {"actor_id": 2000 + i, "first_name": f"FirstName{i}", "last_name": f"LastName{i}", "last_update": last_update}
+        for i in range(1, count + 1)
+    ]
+
+def build_benchmarks(proxy):
+    """Return a dict of benchmark name to zero-argument callable."""
+    workers = [
+        {"host": worker, "port": proxy.INSTANCE_DETAILS["db_details"]["port"]}
+        for worker in proxy.INSTANCE_DETAILS["worker"]["private_ips"]
+    ]
+
+    def warm_latency_cache():
+        for i, worker in enumerate(workers):
+            proxy.LATENCY_CACHE[worker["host"]] = 0.001 * (i + 1)
+
+    def route(mode, query):
+        def run():
+            proxy.mode = mode
+            return asyncio.run(proxy.route_query(query))
+        return run
+
+    def train_adaptive():
+        # Give every strategy a latency sample so adaptive routing is measured in its steady
+        # state rather than while it tries each strategy once; "random" ends up the favourite
+        for strategy, latency in zip(["random", "customized", "direct_hit"], [0.001, 0.002, 0.003]):
+            proxy.record_adaptive_result(strategy, latency, True)
+
+    def route_adaptive(query):
+        # As handle_query does: choose the strategy, then route with it
+        def run():
+            proxy.mode = "adaptive"
+            return asyncio.run(proxy.route_query(query, strategy=proxy.choose_adaptive_strategy()))
+        return run
+
+    def best_worker():
+        return asyncio.run(proxy.get_best_worker_latency_only(workers))
+
+    def cache_lookup():
+        return [proxy.LATENCY_CACHE.get(worker["host"]) for worker in workers]
+
+    def serializer(rows):
+        def run():
+            with proxy.app.app_context():
+                return proxy.app.json.dumps({"results": rows})
+        return run
+
+    warm_latency_cache()
+    train_adaptive()
+    benchmarks = {}
+    for name, query in SAMPLE_QUERIES.items():
+        benchmarks[f"parse_query/{name}"] = (lambda q=query: proxy.parse_query(q))
+    for mode in ["direct_hit", "random", "customized"]:
+        benchmarks[f"route_query/select/{mode}"] = route(mode, SAMPLE_QUERIES["select"])
+    benchmarks["route_query/select/adaptive"] = route_adaptive(SAMPLE_QUERIES["select"])
+    benchmarks["route_query/insert"] = route("direct_hit", SAMPLE_QUERIES["insert"])
+    benchmarks["get_best_worker_latency_only/cached"] = best_worker
+    benchmarks["latency_cache/lookup"] = cache_lookup
+    benchmarks["choose_adaptive_strategy"] = proxy.choose_adaptive_strategy
+    for count in [1, 100, 1000]:
+        benchmarks[f"serialize/{count}_rows"] = serializer(sample_rows(count))
+    return benchmarks, warm_latency_cache
+
+def time_per_op(func, iterations, repeats):
+    """Return the median nanoseconds per call over several timed loops."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter_ns() - start) / iterations)
+    return statistics.median(samples)
+
+def bytes_per_op(func, calls=20):
+    """Return the average peak memory allocated by a single call, as seen by tracemalloc."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+def run_benchmarks(name_filter, iterations, repeats):
+    """Run every matching benchmark and return {name: {"ns_per_op", "bytes_per_op"}}."""
+    proxy = load_proxy()
+    benchmarks, warm_latency_cache = build_benchmarks(proxy)
+    results = {}
+    for name, func in benchmarks.items():
+        if name_filter and name_filter not in name:
+            continue
+        # The TTL cache expires during long runs; keep it warm so "customized" measures the cached path
+        warm_latency_cache()
+        func()  # Warm-up
+        # Routing through asyncio.run is far slower than the rest; scale it down to keep runs short
+        loops = max(iterations // 100, 1) if "route_query" in name or "best_worker" in name else iterations
+        results[name] = {
+            "ns_per_op": time_per_op(func, loops, repeats),
+            "bytes_per_op": bytes_per_op(func),
+        }
+        print(f"{name:45s} {results[name]['ns_per_op']:>14,.0f} ns/op {results[name]['bytes_per_op']:>12,.0f} B/op")
+    return results
+
+def compare_to_baseline(results, baseline_path, threshold):
+    """Print the change against a saved baseline and return the names that regressed."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nComparison against {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:45s} (no baseline)")
+            continue
+        change = result["ns_per_op"] / baseline[name]["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:45s} {change:>+8.1%} time {result['bytes_per_op'] - baseline[name]['bytes_per_op']:>+10,.0f} B/op{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the proxy's per-request hot paths")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Calls per timed loop")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Timed loops per benchmark")
+    parser.add_argument("--save", help="Write results to this JSON file (e.g. before a change)")
+    parser.add_argument("--compare", help="Compare results with a JSON file written by --save")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter, args.iterations, args.repeats)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults saved to {args.save}")
+
+    if args.compare:
+        regressions = compare_to_baseline(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
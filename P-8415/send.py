@@ -1,4 +1,5 @@
 import requests
+import threading
 import time
 import json
 import os
@@ -16,22 +17,35 @@ def load_gatekeeper_url():
     except (FileNotFoundError, KeyError, IndexError) as e:
         raise Exception(f"Failed to load Gatekeeper URL: {e}")
 
+def load_admin_token():
+    """Load the token the Gatekeeper requires for admin commands such as REPLICATION_STATUS."""
+    try:
+        with open(CONFIG_FILE_PATH, "r") as config_file:
+            return json.load(config_file)["admin_token"]
+    except (FileNotFoundError, KeyError) as e:
+        raise Exception(f"Failed to load admin token: {e}")
+
 # Fetch Gatekeeper URL dynamically
 try:
     GATEKEEPER_URL = load_gatekeeper_url()
+    ADMIN_TOKEN = load_admin_token()
     print(f"Using Gatekeeper URL: {GATEKEEPER_URL}")
 except Exception as e:
     print(f"Error: {e}")
     exit(1)
 
 # Test Data
-MODES = ["direct_hit", "random", "customized"]
+MODES = ["direct_hit", "random", "customized", "adaptive"]
 TEST_TABLE = "actor"  # Sakila's `actor` table
 
+# Replication monitoring
+REPLICATION_POLL_INTERVAL = 0.1  # seconds between replication status polls
+REPLICATION_CONVERGENCE_TIMEOUT = 60  # give up waiting for workers after this many seconds
+
 def send_write_request(session, query):
-    """Send a write request to the Gatekeeper."""
+    """Send a write request to the Gatekeeper, asking for the binlog position it produced."""
     start_time = time.time()
-    response = session.post(f"{GATEKEEPER_URL}/filter", json={"query": query})
+    response = session.post(f"{GATEKEEPER_URL}/filter", json={"query": query, "track_replication": True})
     elapsed_time = time.time() - start_time
     return response, elapsed_time
 
@@ -42,6 +56,80 @@ def send_read_request(session, query):
     elapsed_time = time.time() - start_time
     return response, elapsed_time
 
+def binlog_key(position):
+    """Turn binlog coordinates into a comparable (file, offset) tuple."""
+    return (position["file"], int(position["position"]))
+
+def fetch_replication_status(session):
+    """Fetch the applied binlog position of every worker through the Gatekeeper."""
+    response = session.post(f"{GATEKEEPER_URL}/filter", json={"query": "REPLICATION_STATUS", "admin_token": ADMIN_TOKEN})
+    response.raise_for_status()
+    return response.json()
+
+def poll_replication(snapshots, stop_event):
+    """Record (timestamp, {worker: position}) snapshots until asked to stop."""
+    with requests.Session() as session:
+        while not stop_event.is_set():
+            try:
+                status = fetch_replication_status(session)
+                observed_at = time.time()
+                # Workers whose status could not be read stay in the snapshot as None
+                positions = {
+                    worker: binlog_key(worker_status) if worker_status and worker_status.get("file") else None
+                    for worker, worker_status in status.get("workers", {}).items()
+                }
+                snapshots.append((observed_at, positions))
+            except Exception as e:
+                print(f"Replication status poll failed: {e}")
+            stop_event.wait(REPLICATION_POLL_INTERVAL)
+
+def wait_for_convergence(snapshots, target, timeout=REPLICATION_CONVERGENCE_TIMEOUT):
+    """
+    Block until the latest snapshot shows every worker at or past the target position.
+
+    A worker whose position could not be read counts as not converged.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if snapshots:
+            _, positions = snapshots[-1]
+            if positions and all(position is not None and position >= target for position in positions.values()):
+                return True
+        time.sleep(REPLICATION_POLL_INTERVAL)
+    return False
+
+def compute_replication_lags(writes, snapshots):
+    """
+    Compute, per worker, how long each write took to become visible there.
+
+    :param writes: List of (commit_time, binlog_key) for every successful write.
+    :param snapshots: Time-ordered list of (observed_at, {worker: binlog_key}).
+    :return: Dict mapping worker to a list of lags in seconds.
+    """
+    workers = set()
+    for _, positions in snapshots:
+        workers.update(positions)
+
+    lags = {worker: [] for worker in workers}
+    for worker in workers:
+        index = 0
+        # Writes are committed in binlog order, so each one can resume the scan where the last stopped
+        for commit_time, position in sorted(writes, key=lambda write: write[1]):
+            while index < len(snapshots) and not (
+                snapshots[index][0] >= commit_time and (snapshots[index][1].get(worker) or ("", -1)) >= position
+            ):
+                index += 1
+            if index == len(snapshots):
+                break
+            lags[worker].append(snapshots[index][0] - commit_time)
+    return lags
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
 def benchmark_via_gatekeeper():
     """Perform benchmarking for each mode."""
     for mode in MODES:
@@ -59,8 +147,15 @@ def benchmark_via_gatekeeper():
         start_time = time.time()
         write_times = []
         read_times = []
+        write_positions = []
         data_validation_errors = 0
 
+        # Poll worker positions in the background so lag is measured while writes are in flight
+        snapshots = []
+        stop_polling = threading.Event()
+        poller = threading.Thread(target=poll_replication, args=(snapshots, stop_polling), daemon=True)
+        poller.start()
+
         # Step 2: Send 1000 Write Requests (to `actor` table)
         print("Sending 1000 write requests...")
         write_query_template = f"""
@@ -75,12 +170,26 @@ def benchmark_via_gatekeeper():
                 write_times.append(elapsed_time)
                 if response.status_code != 200:
                     print(f"Write request {i} failed: {response.text}")
+                elif response.json().get("binlog"):
+                    # The response arrival time is an upper bound on the commit time
+                    write_positions.append((time.time(), binlog_key(response.json()["binlog"])))
                 if i % 100 == 0:
                     print(f"{i} write requests sent.")
 
-        # Wait for replication to complete
-        print("Waiting for replication to complete...")
-        time.sleep(5)  # Adjust wait time based on replication speed
+        # Wait until every worker has applied the last write instead of sleeping a fixed time
+        print("Waiting for replication to converge...")
+        convergence_start = time.time()
+        if write_positions:
+            target = max(position for _, position in write_positions)
+            converged = wait_for_convergence(snapshots, target)
+        else:
+            converged = False
+        stop_polling.set()
+        poller.join()
+        if converged:
+            print(f"Workers converged {time.time() - convergence_start:.2f} seconds after the last write.")
+        else:
+            print("Workers did not converge before the timeout; reads may return stale data.")
 
         # Step 3: Send 1000 Read Requests (to verify writes)
         print("Sending 1000 read requests...")
@@ -115,5 +224,22 @@ def benchmark_via_gatekeeper():
         print(f"Total writes: {len(write_times)}, Total reads: {len(read_times)}")
         print(f"Data validation errors: {data_validation_errors}")
 
+        if mode == "adaptive":
+            stats = requests.post(f"{GATEKEEPER_URL}/filter", json={"query": "ROUTING_STATS", "admin_token": ADMIN_TOKEN}).json()
+            print(f"Adaptive mode favours: {stats.get('best_strategy')}")
+            for strategy, strategy_stats in stats.get("strategies", {}).items():
+                print(f"  {strategy}: {strategy_stats['requests']} reads, average latency {strategy_stats['ewma_latency']}")
+
+        replication_lags = compute_replication_lags(write_positions, snapshots)
+        for worker, lags in sorted(replication_lags.items()):
+            if not lags:
+                print(f"Replication lag on {worker}: no writes observed")
+                continue
+            print(
+                f"Replication lag on {worker} ({len(lags)} writes): "
+                f"p50 {percentile(lags, 50):.4f}s, p95 {percentile(lags, 95):.4f}s, "
+                f"p99 {percentile(lags, 99):.4f}s, max {max(lags):.4f}s"
+            )
+
 if __name__ == "__main__":
     benchmark_via_gatekeeper()
@@ -2,6 +2,7 @@
 
 # Constants
 DB_ROOT_PASSWORD=${1:-default_password}
+SAKILA_MODE=${2:-import}   # "import" loads Sakila from the tarball, "skip" leaves it to a snapshot from the manager
 LOG_FILE="/var/log/mysql_setup.log"
 exec > >(tee -a "$LOG_FILE") 2>&1
 
@@ -30,37 +31,24 @@ sudo mysql -u root -p"$DB_ROOT_PASSWORD" -e "FLUSH PRIVILEGES;"
 sudo sed -i 's/bind-address\s*=.*$/bind-address = 0.0.0.0/' /etc/mysql/mysql.conf.d/mysqld.cnf
 sudo systemctl restart mysql
 
-# Install Sakila Sample Database
-echo "Installing Sakila database..."
-wget https://downloads.mysql.com/docs/sakila-db.tar.gz
-tar xzf sakila-db.tar.gz
-
-if mysql -u root -p"$DB_ROOT_PASSWORD" -e "USE sakila;" 2>/dev/null; then
-    echo "Sakila database already exists. Skipping import."
+if [[ "$SAKILA_MODE" == "skip" ]]; then
+    # Sakila will arrive with the manager's snapshot
+    echo "Skipping Sakila import; data will be streamed from the manager."
 else
-    mysql -u root -p"$DB_ROOT_PASSWORD" -e "CREATE DATABASE sakila;"
-    mysql -u root -p"$DB_ROOT_PASSWORD" sakila < sakila-db/sakila-schema.sql
-    mysql -u root -p"$DB_ROOT_PASSWORD" sakila < sakila-db/sakila-data.sql
+    # Install Sakila Sample Database
+    echo "Installing Sakila database..."
+    wget https://downloads.mysql.com/docs/sakila-db.tar.gz
+    tar xzf sakila-db.tar.gz
+
+    if mysql -u root -p"$DB_ROOT_PASSWORD" -e "USE sakila;" 2>/dev/null; then
+        echo "Sakila database already exists. Skipping import."
+    else
+        mysql -u root -p"$DB_ROOT_PASSWORD" -e "CREATE DATABASE sakila;"
+        mysql -u root -p"$DB_ROOT_PASSWORD" sakila < sakila-db/sakila-schema.sql
+        mysql -u root -p"$DB_ROOT_PASSWORD" sakila < sakila-db/sakila-data.sql
+    fi
+
+    rm -rf sakila-db sakila-db.tar.gz
 fi
 
-rm -rf sakila-db sakila-db.tar.gz
-
-# Install Sysbench
-echo "Installing Sysbench..."
-sudo apt-get install -y sysbench || exit 1
-
-# Prepare and Run Sysbench
-echo "Running Sysbench benchmarks..."
-sysbench /usr/share/sysbench/oltp_read_only.lua \
-  --mysql-db=sakila \
-  --mysql-user=root \
-  --mysql-password="$DB_ROOT_PASSWORD" \
-  prepare
-
-sysbench /usr/share/sysbench/oltp_read_only.lua \
-  --mysql-db=sakila \
-  --mysql-user=root \
-  --mysql-password="$DB_ROOT_PASSWORD" \
-  run
-
-echo "MySQL setup and benchmarking complete."
+echo "MySQL setup complete."
@@ -1,9 +1,9 @@
 #!/bin/bash
 
-ROLE=$1                # "manager" or "worker"
+ROLE=$1                # "manager", "worker" or "worker_snapshot"
 MASTER_IP=$2           # Manager's IP address (for workers)
-MASTER_LOG_FILE=$3     # Log file from manager (for workers)
-MASTER_LOG_POS=$4      # Log position from manager (for workers)
+MASTER_LOG_FILE=$3     # Log file from manager (for "worker" only)
+MASTER_LOG_POS=$4      # Log position from manager (for "worker" only)
 ROOT_PASSWORD=$5       # Root password for MySQL
 REPL_USER=$6           # Replication user name
 REPL_PASSWORD=$7       # Replication user password
@@ -27,6 +27,26 @@ wait_for_mysql() {
     log "MySQL is ready."
 }
 
+configure_worker_mysql() {
+    # Update MySQL configuration for replication
+    sudo sed -i "/\[mysqld\]/a \
+server-id=$((RANDOM % 1000 + 2))\n\
+relay_log=/var/log/mysql/mysql-relay-bin.log\n\
+gtid_mode=ON\n\
+enforce_gtid_consistency=ON\n\
+read_only=1" /etc/mysql/mysql.conf.d/mysqld.cnf
+    sudo sed -i 's/^bind-address\s*=.*$/bind-address = 0.0.0.0/' /etc/mysql/mysql.conf.d/mysqld.cnf
+    sudo systemctl restart mysql
+    wait_for_mysql
+
+    # Create proxy user with necessary privileges before setting super_read_only
+    mysql -u root -p"$ROOT_PASSWORD" -e "
+    CREATE USER IF NOT EXISTS '$PROXY_USER'@'%' IDENTIFIED BY '$PROXY_PASSWORD';
+    GRANT SELECT ON sakila.* TO '$PROXY_USER'@'%';
+    GRANT REPLICATION CLIENT ON *.* TO '$PROXY_USER'@'%';
+    FLUSH PRIVILEGES;"
+}
+
 if [[ "$ROLE" == "manager" ]]; then
     log "Configuring as Manager..."
 
@@ -35,6 +55,8 @@ if [[ "$ROLE" == "manager" ]]; then
 server-id=1\n\
 log_bin=/var/log/mysql/mysql-bin.log\n\
 binlog_format=MIXED\n\
+gtid_mode=ON\n\
+enforce_gtid_consistency=ON\n\
 binlog_ignore_db=mysql' /etc/mysql/mysql.conf.d/mysqld.cnf
     sudo sed -i 's/^bind-address\s*=.*$/bind-address = 0.0.0.0/' /etc/mysql/mysql.conf.d/mysqld.cnf
     sudo systemctl restart mysql
@@ -44,13 +66,15 @@ binlog_ignore_db=mysql' /etc/mysql/mysql.conf.d/mysqld.cnf
     mysql -u root -p"$ROOT_PASSWORD" -e "
     CREATE USER IF NOT EXISTS '$REPL_USER'@'%' IDENTIFIED BY '$REPL_PASSWORD';
     GRANT REPLICATION SLAVE ON *.* TO '$REPL_USER'@'%';
-    GRANT SELECT ON sakila.* TO '$REPL_USER'@'%';
+    GRANT SELECT, SHOW VIEW, TRIGGER, LOCK TABLES ON sakila.* TO '$REPL_USER'@'%';
+    GRANT RELOAD, REPLICATION CLIENT, SHOW_ROUTINE ON *.* TO '$REPL_USER'@'%';
     FLUSH PRIVILEGES;"
 
     # Create proxy user with necessary privileges
     mysql -u root -p"$ROOT_PASSWORD" -e "
     CREATE USER IF NOT EXISTS '$PROXY_USER'@'%' IDENTIFIED BY '$PROXY_PASSWORD';
     GRANT SELECT, INSERT, UPDATE, DELETE, CREATE ON sakila.* TO '$PROXY_USER'@'%';
+    GRANT REPLICATION CLIENT ON *.* TO '$PROXY_USER'@'%';
     FLUSH PRIVILEGES;"
 
     # Show master status for workers
@@ -67,20 +91,7 @@ elif [[ "$ROLE" == "worker" ]]; then
         exit 1
     fi
 
-    # Update MySQL configuration for replication
-    sudo sed -i "/\[mysqld\]/a \
-server-id=$((RANDOM % 1000 + 2))\n\
-relay_log=/var/log/mysql/mysql-relay-bin.log\n\
-read_only=1" /etc/mysql/mysql.conf.d/mysqld.cnf
-    sudo sed -i 's/^bind-address\s*=.*$/bind-address = 0.0.0.0/' /etc/mysql/mysql.conf.d/mysqld.cnf
-    sudo systemctl restart mysql
-    wait_for_mysql
-
-    # Create proxy user with necessary privileges before setting super_read_only
-    mysql -u root -p"$ROOT_PASSWORD" -e "
-    CREATE USER IF NOT EXISTS '$PROXY_USER'@'%' IDENTIFIED BY '$PROXY_PASSWORD';
-    GRANT SELECT ON sakila.* TO '$PROXY_USER'@'%';
-    FLUSH PRIVILEGES;"
+    configure_worker_mysql
 
     # Now set super_read_only
     mysql -u root -p"$ROOT_PASSWORD" -e "SET GLOBAL super_read_only = 1;"
@@ -102,8 +113,53 @@ read_only=1" /etc/mysql/mysql.conf.d/mysqld.cnf
     SLAVE_STATUS=$(mysql -u root -p"$ROOT_PASSWORD" -e "SHOW SLAVE STATUS\G")
     log "Slave Status: $SLAVE_STATUS"
 
+elif [[ "$ROLE" == "worker_snapshot" ]]; then
+    log "Configuring as Worker from a snapshot of the Manager..."
+
+    if [[ -z "$MASTER_IP" ]]; then
+        log "Error: MASTER_IP must be provided."
+        exit 1
+    fi
+
+    configure_worker_mysql
+
+    # Start from an empty GTID history so the snapshot's GTID_PURGED can be applied
+    mysql -u root -p"$ROOT_PASSWORD" -e "
+    STOP SLAVE;
+    RESET SLAVE ALL;
+    RESET MASTER;"
+
+    # Stream a consistent snapshot straight into the local server. --single-transaction with
+    # --source-data pins the snapshot and its GTID set under a brief global read lock, so
+    # writes running on the manager meanwhile are replayed by replication, not lost.
+    log "Streaming snapshot from $MASTER_IP..."
+    mysqldump -h "$MASTER_IP" -u "$REPL_USER" -p"$REPL_PASSWORD" \
+        --single-transaction --source-data=2 --set-gtid-purged=ON \
+        --routines --triggers --databases sakila \
+        | mysql -u root -p"$ROOT_PASSWORD"
+    if [[ ${PIPESTATUS[0]} -ne 0 || ${PIPESTATUS[1]} -ne 0 ]]; then
+        log "Error: streaming the snapshot from $MASTER_IP failed."
+        exit 1
+    fi
+
+    # Replicate everything after the snapshot's GTID set
+    mysql -u root -p"$ROOT_PASSWORD" -e "
+    CHANGE MASTER TO
+        MASTER_HOST='$MASTER_IP',
+        MASTER_USER='$REPL_USER',
+        MASTER_PASSWORD='$REPL_PASSWORD',
+        MASTER_AUTO_POSITION=1,
+        GET_MASTER_PUBLIC_KEY=1;
+    START SLAVE;"
+
+    mysql -u root -p"$ROOT_PASSWORD" -e "SET GLOBAL super_read_only = 1;"
+
+    # Show slave status for debugging
+    SLAVE_STATUS=$(mysql -u root -p"$ROOT_PASSWORD" -e "SHOW SLAVE STATUS\G")
+    log "Slave Status: $SLAVE_STATUS"
+
 else
-    log "Invalid role specified. Must be 'manager' or 'worker'."
+    log "Invalid role specified. Must be 'manager', 'worker' or 'worker_snapshot'."
     exit 1
 fi
 
@@ -0,0 +1,72 @@
+#!/bin/bash
+
+ACTION=$1              # "install", "prepare", "wait", "run" or "cleanup"
+ROOT_PASSWORD=$2       # Root password for MySQL
+WORKLOAD=$3            # Sysbench Lua workload, e.g. oltp_read_only (for "prepare" and "run")
+THREADS=$4             # Client threads (for "run")
+DURATION=$5            # Seconds to run (for "run")
+TABLES=$6              # Number of sbtest tables (for "prepare" and "run")
+TABLE_SIZE=$7          # Rows per table (for "prepare" and "run")
+GTID_SET=$8            # Manager GTID set a worker must reach (for "wait")
+
+SYSBENCH_DB="sbtest"
+WAIT_TIMEOUT=600       # Seconds a worker may take to replicate the prepared tables
+
+if [[ -z "$ACTION" || -z "$ROOT_PASSWORD" ]]; then
+    echo "Error: ACTION and ROOT_PASSWORD must be provided."
+    exit 1
+fi
+
+log() {
+    echo "$(date '+%Y-%m-%d %H:%M:%S') - $1"
+}
+
+sysbench_cmd() {
+    sysbench "/usr/share/sysbench/$WORKLOAD.lua" \
+      --mysql-db="$SYSBENCH_DB" \
+      --mysql-user=root \
+      --mysql-password="$ROOT_PASSWORD" \
+      --tables="$TABLES" \
+      --table-size="$TABLE_SIZE" \
+      "$@"
+}
+
+case "$ACTION" in
+    install)
+        if command -v sysbench &> /dev/null; then
+            log "Sysbench already installed."
+        else
+            log "Installing Sysbench..."
+            sudo apt-get update && sudo apt-get install -y sysbench || exit 1
+        fi
+        ;;
+    prepare)
+        # Run on the manager only; the tables reach the workers through replication
+        log "Preparing $TABLES tables of $TABLE_SIZE rows in $SYSBENCH_DB..."
+        mysql -u root -p"$ROOT_PASSWORD" -e "DROP DATABASE IF EXISTS $SYSBENCH_DB; CREATE DATABASE $SYSBENCH_DB;" || exit 1
+        sysbench_cmd prepare || exit 1
+        mysql -u root -p"$ROOT_PASSWORD" -N -e "SELECT @@GLOBAL.gtid_executed;" | tr -d '\n'
+        ;;
+    wait)
+        log "Waiting for GTID set $GTID_SET..."
+        RESULT=$(mysql -u root -p"$ROOT_PASSWORD" -N -e "SELECT WAIT_FOR_EXECUTED_GTID_SET('$GTID_SET', $WAIT_TIMEOUT);")
+        if [[ "$RESULT" != "0" ]]; then
+            log "Error: worker did not replicate the prepared tables in time."
+            exit 1
+        fi
+        log "Prepared tables are available."
+        ;;
+    run)
+        log "Running $WORKLOAD with $THREADS threads for $DURATION seconds..."
+        sysbench_cmd --threads="$THREADS" --time="$DURATION" run || exit 1
+        ;;
+    cleanup)
+        # Run on the manager only; the drop replicates to the workers
+        mysql -u root -p"$ROOT_PASSWORD" -e "DROP DATABASE IF EXISTS $SYSBENCH_DB;" || exit 1
+        log "Removed $SYSBENCH_DB."
+        ;;
+    *)
+        log "Invalid action specified. Must be 'install', 'prepare', 'wait', 'run' or 'cleanup'."
+        exit 1
+        ;;
+esac
@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_START_HEADER = "X-Request-Start"  # Epoch seconds at which the previous hop sent the request
+SAMPLED_HEADER = "X-Trace-Sampled"
+
+# Share of requests, decided once at the first tier, whose spans are written to TRACE_EXPORT_PATH
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "/home/ubuntu/traces.jsonl")
+EXPORT_LOCK = threading.Lock()
+
+def init_app(app, tier, trust_upstream=False):
+    """
+    Record per-request spans for a Flask app and report them in a Server-Timing header.
+
+    With trust_upstream, the request ID, sampling decision and send time are taken
+    from the calling tier; otherwise, as at the public gatekeeper, they are ignored and
+    every request starts a new trace. Downstream Server-Timing entries passed to
+    add_downstream_timing are appended after this tier's own spans.
+    """
+    @app.before_request
+    def start_trace():
+        now = time.time()
+        headers = request.headers if trust_upstream else {}
+        sampled = headers.get(SAMPLED_HEADER)
+        g.trace = {
+            "request_id": headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex,
+            "sampled": sampled == "1" if sampled is not None else random.random() < TRACE_SAMPLE_RATE,
+            "start": now,
+            "start_counter": time.perf_counter(),
+            "spans": [],
+            "downstream": [],
+        }
+        sent_at = headers.get(REQUEST_START_HEADER)
+        if sent_at:
+            try:
+                # Includes network transfer and waiting for a server thread; clocks are NTP-synced within the VPC
+                g.trace["spans"].append(("queue", max(now - float(sent_at), 0.0) * 1000))
+            except ValueError:
+                pass
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.get("trace")
+        if trace is None:
+            return response
+        trace["spans"].append(("total", (time.perf_counter() - trace["start_counter"]) * 1000))
+        entries = [f"{tier}.{name};dur={duration:.2f}" for name, duration in trace["spans"]]
+        response.headers["Server-Timing"] = ", ".join(entries + trace["downstream"])
+        response.headers[REQUEST_ID_HEADER] = trace["request_id"]
+        if trace["sampled"]:
+            try:
+                export(tier, trace)
+            except OSError as e:
+                app.logger.warning(f"Could not export trace {trace['request_id']}: {e}")
+        return response
+
+@contextmanager
+def span(name):
+    """Time a block as a named span of the current request; does nothing outside a request."""
+    trace = g.get("trace") if has_request_context() else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace["spans"].append((name, (time.perf_counter() - start) * 1000))
+
+def forward_headers():
+    """Headers that carry the trace context to the next tier."""
+    trace = g.get("trace") if has_request_context() else None
+    if trace is None:
+        return {}
+    return {
+        REQUEST_ID_HEADER: trace["request_id"],
+        REQUEST_START_HEADER: repr(time.time()),
+        SAMPLED_HEADER: "1" if trace["sampled"] else "0",
+    }
+
+def add_downstream_timing(headers):
+    """Keep the Server-Timing entries returned by the next tier for this tier's response."""
+    trace = g.get("trace") if has_request_context() else None
+    if trace is not None and headers.get("Server-Timing"):
+        trace["downstream"].append(headers["Server-Timing"])
+
+def export(tier, trace):
+    """Append one sampled trace to the local export file as a JSON line."""
+    record = {
+        "request_id": trace["request_id"],
+        "tier": tier,
+        "start": trace["start"],
+        "spans": {name: round(duration, 3) for name, duration in trace["spans"]},
+    }
+    with EXPORT_LOCK:
+        with open(TRACE_EXPORT_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")